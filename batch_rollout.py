@@ -0,0 +1,81 @@
+import numpy as np
+import p3_t3
+
+# Cell c of a 9-bit mask is bit c, as in p3_t3.positions.
+cell_bits = np.left_shift(1, np.arange(9)).astype(np.uint16)
+win_table = np.array(p3_t3.win_table, dtype=bool)
+
+
+def to_arrays(states):
+    """ Converts state tuples into the arrays advanced by batch_rollout.
+
+    Returns:    sub[k, player_index, sub_board] masks, big[k, player_index] masks, constraint[k] as 3 * R + C
+                or -1 when unconstrained, and player_index[k] of the player to move.
+    """
+    k = len(states)
+    data = np.array([state[:20] for state in states], dtype=np.uint16)
+    sub = data[:, :18].reshape(k, 9, 2).transpose(0, 2, 1).copy()
+    big = data[:, 18:20].copy()
+    constraint = np.array([-1 if state[20] is None else 3 * state[20] + state[21] for state in states],
+                          dtype=np.int16)
+    player = np.array([state[22] - 1 for state in states], dtype=np.int16)
+    return sub, big, constraint, player
+
+
+def outcomes(big):
+    """ The Board.outcome of every game as an array: 1 or 2 for the winner, 0 for a draw, -1 if not ended. """
+    p1 = big[:, 0] & ~big[:, 1]
+    p2 = big[:, 1] & ~big[:, 0]
+    result = np.full(len(big), -1, dtype=np.int8)
+    result[(big[:, 0] | big[:, 1]) == 0x1ff] = 0
+    result[win_table[p2]] = 2
+    result[win_table[p1]] = 1
+    return result
+
+
+def batch_rollout(states, rng=None):
+    """ Plays every state out with uniformly random moves, advancing all unfinished games in lockstep.
+
+    Args:
+        states: A sequence of K state tuples.
+        rng:    Optional numpy random Generator.
+
+    Returns:    An array of K outcomes in the format of Board.outcome, with 0 for a draw.
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    sub, big, constraint, player = to_arrays(states)
+    result = outcomes(big)
+    cells = np.arange(9)
+
+    active = np.nonzero(result < 0)[0]
+    while len(active):
+        n = len(active)
+        p = player[active]
+        occupied = sub[active, 0, :] | sub[active, 1, :]
+        finished = big[active, 0] | big[active, 1]
+
+        # legal[i, 9 * s + c]: sub-board s is open and allowed by the constraint, and cell c of it is free
+        open_sub = (finished[:, None] & cell_bits) == 0
+        allowed = open_sub & ((constraint[active, None] < 0) | (constraint[active, None] == cells))
+        free = (occupied[:, :, None] & cell_bits) == 0
+        legal = (allowed[:, :, None] & free).reshape(n, 81)
+
+        # the largest of independent uniform keys over the legal moves is a uniform legal move
+        action = np.argmax(rng.random((n, 81)) * legal, axis=1)
+        s, c = action // 9, action % 9
+
+        sub[active, p, s] |= cell_bits[c]
+        won = win_table[sub[active, p, s]]
+        full = ~won & ((sub[active, 0, s] | sub[active, 1, s]) == 0x1ff)
+        big[active[won], p[won]] |= cell_bits[s[won]]
+        big[active[full], 0] |= cell_bits[s[full]]
+        big[active[full], 1] |= cell_bits[s[full]]
+
+        finished = big[active, 0] | big[active, 1]
+        constraint[active] = np.where(finished & cell_bits[c], -1, c)
+        player[active] = 1 - p
+
+        result[active] = outcomes(big[active])
+        active = active[result[active] < 0]
+
+    return result
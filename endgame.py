@@ -0,0 +1,76 @@
+from p3_t3 import popcount_table
+
+capacity = 1 << 20     # Entries kept in the cache before it is cleared.
+cache = {}              # State -> (value, bound) of earlier searches, shared by every solve call.
+
+exact, lower, upper = 0, 1, 2
+
+
+def empty_cells(state):
+    """ The number of empty cells on sub-boards that are still being played, which bounds the number of moves
+    left in the game.
+    """
+    finished = state[18] | state[19]
+    return sum([9 - popcount_table[state[2 * sub] | state[2 * sub + 1]]
+                for sub in range(9) if not finished & (1 << sub)])
+
+
+def negamax(board, state, alpha, beta):
+    """ Alpha-beta search to the end of the game.
+
+    Returns:    The value of state for the player to move: 1 for a win, 0 for a draw and -1 for a loss.
+    """
+    entry = cache.get(state)
+    if entry is not None:
+        value, bound = entry
+        if bound == exact:
+            return value
+        if bound == lower:
+            alpha = max(alpha, value)
+        else:
+            beta = min(beta, value)
+        if alpha >= beta:
+            return value
+
+    player = board.current_player(state)
+    successors = [board.next_state(state, action) for action in board.legal_actions(state)]
+
+    # a move that ends the game is as good as it gets, or at least needs no search
+    best = -2
+    for successor in successors:
+        result = board.outcome(successor)
+        if result == player:
+            cache[state] = (1, exact)
+            return 1
+        if result is not None:
+            best = max(best, 0 if result == 0 else -1)
+
+    alpha_original = alpha
+    alpha = max(alpha, best)
+    for successor in successors:
+        if alpha >= beta:
+            break
+        if board.outcome(successor) is None:
+            value = -negamax(board, successor, -beta, -alpha)
+            if value > best:
+                best = value
+                alpha = max(alpha, value)
+
+    if len(cache) >= capacity:
+        cache.clear()
+    cache[state] = (best, upper if best <= alpha_original else lower if best >= beta else exact)
+    return best
+
+
+def solve(board, state):
+    """ Plays the game out perfectly from state.
+
+    Returns:    The result in the convention of Board.outcome: 1 or 2 for the winning player, 0 for a draw.
+    """
+    result = board.outcome(state)
+    if result is not None:
+        return result
+    value = negamax(board, state, -1, 1)
+    if value == 0:
+        return 0
+    return board.current_player(state) if value == 1 else 3 - board.current_player(state)
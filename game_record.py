@@ -0,0 +1,142 @@
+import argparse
+import json
+import mmap
+import os
+from timeit import default_timer as time
+import p3_t3
+from p3_t3 import action_table, action_indices
+
+# A game log is a short header followed by one record per game: a byte with the number of moves, a byte with the
+# result (as in Board.outcome, or 255 for a game that was not finished) and then one byte per move holding its
+# index 9 * (3 * R + C) + (3 * r + c) in p3_t3.action_table. A game has at most 81 moves, so a record is at most
+# 83 bytes and records can be appended to the log forever.
+magic = b'P3GR\x01'
+unfinished = 255
+
+
+class RecordWriter:
+    def __init__(self, path):
+        """ Appends games to the log at path, creating it if needed. Use it as a context manager or close it. """
+        new = not os.path.exists(path) or not os.path.getsize(path)
+        self.file = open(path, 'ab')
+        if new:
+            self.file.write(magic)
+        self.games = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write(self, actions, result=None):
+        """ Appends one game, given its actions from the starting state and its result as in Board.outcome. """
+        moves = bytes([action_indices[action] for action in actions])
+        self.file.write(bytes([len(moves), unfinished if result is None else result]) + moves)
+        self.games += 1
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def read_records(path):
+    """ Yields the (result, moves) of every game in the log at path, with moves as the raw bytes of the record.
+    The file is memory-mapped, so scanning a large log only touches the pages it reads.
+    """
+    with open(path, 'rb') as f:
+        if not os.path.getsize(path):
+            return
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if data[:len(magic)] != magic:
+                raise ValueError("%s is not a game log" % path)
+            offset, end = len(magic), len(data)
+            while offset < end:
+                length, result = data[offset], data[offset + 1]
+                yield (None if result == unfinished else result), data[offset + 2:offset + 2 + length]
+                offset += 2 + length
+        finally:
+            data.close()
+
+
+def actions(moves):
+    """ The actions of a record's move bytes. """
+    return [action_table[move] for move in moves]
+
+
+def replay(board, moves):
+    """ Yields the states of a game lazily: the starting state and then the state after each move. """
+    state = board.starting_state()
+    yield state
+    for move in moves:
+        state = board.next_state(state, action_table[move])
+        yield state
+
+
+def action_between(before, after):
+    """ The action that leads from state before to state after, read from the one cell that was filled. """
+    for i in range(18):
+        changed = before[i] ^ after[i]
+        if changed:
+            return action_table[9 * (i // 2) + changed.bit_length() - 1]
+
+
+def to_json(board, path, out):
+    """ Writes every game of the log at path to the open file out as a JSON line with its result, its actions in
+    the notation of Board.unpack_action and its states in the shape of Board.unpack_state.
+
+    Returns:    The number of games written.
+    """
+    games = 0
+    for result, moves in read_records(path):
+        out.write(json.dumps(dict(
+            result=result,
+            moves=[board.unpack_action(action_table[move]) for move in moves],
+            states=[board.unpack_state(state) for state in replay(board, moves)],
+        )) + '\n')
+        games += 1
+    return games
+
+
+def from_json(board, lines, path):
+    """ Appends the games of JSON lines written by to_json to the log at path. The moves are recovered from the
+    states, so lines that only hold states in the shape of Board.pack_state are enough.
+
+    Returns:    The number of games written.
+    """
+    with RecordWriter(path) as writer:
+        for line in lines:
+            game = json.loads(line)
+            states = [board.pack_state(data) for data in game['states']]
+            game_actions = [action_between(before, after) for before, after in zip(states, states[1:])]
+            writer.write(game_actions, board.outcome(states[-1]))
+        return writer.games
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Convert and scan binary game logs.")
+    parser.add_argument('command', choices=('to-json', 'from-json', 'scan'))
+    parser.add_argument('source', help="game log, or JSON lines for from-json")
+    parser.add_argument('target', nargs='?', help="JSON lines for to-json, game log for from-json")
+    args = parser.parse_args()
+
+    board = p3_t3.Board()
+    start = time()
+    if args.command == 'to-json':
+        with open(args.target, 'w') as out:
+            games = to_json(board, args.source, out)
+    elif args.command == 'from-json':
+        with open(args.source) as lines:
+            games = from_json(board, lines, args.target)
+    else:
+        results = {}
+        games = moves = 0
+        for result, record in read_records(args.source):
+            results[result] = results.get(result, 0) + 1
+            games += 1
+            moves += len(record)
+        print("Results:", results, "Moves:", moves)
+    print("%d games in %.2f seconds" % (games, time() - start))
@@ -0,0 +1,95 @@
+from math import log, log10, sqrt
+
+
+def expected_score(elo):
+    """ The expected score per game of a player rated elo points above its opponent. """
+    return 1 / (1 + 10 ** (-elo / 400))
+
+
+def elo(score):
+    """ The Elo difference that gives an expected score per game of score (clamped away from 0 and 1). """
+    score = min(max(score, 1e-6), 1 - 1e-6)
+    return -400 * log10(1 / score - 1)
+
+
+def score_stats(wins, draws, losses):
+    """ Returns:    The mean score per game (win 1, draw 0.5, loss 0) and its per-game variance, or None when
+                    there are no games.
+    """
+    games = wins + draws + losses
+    if not games:
+        return None
+    mean = (wins + 0.5 * draws) / games
+    variance = (wins + 0.25 * draws) / games - mean ** 2
+    return mean, variance
+
+
+def elo_interval(wins, draws, losses, z=1.96):
+    """ The estimated Elo difference with a normal-approximation confidence interval, z = 1.96 giving 95%. The
+    variance is estimated with one extra win, draw and loss as in SPRT.llr, so that a few games that all went
+    the same way do not give an interval without width.
+
+    Returns:    A (low, estimate, high) tuple, or None when there are no games.
+    """
+    games = wins + draws + losses
+    if not games:
+        return None
+    mean = score_stats(wins, draws, losses)[0]
+    variance = score_stats(wins + 1, draws + 1, losses + 1)[1]
+    margin = z * sqrt(variance / games)
+    return elo(mean - margin), elo(mean), elo(mean + margin)
+
+
+class SPRT:
+    def __init__(self, elo0=0., elo1=20., alpha=0.05, beta=0.05):
+        """ A sequential probability ratio test of H0: the Elo difference is elo0 against H1: it is elo1, on
+        game results from the first player's point of view. The log-likelihood ratio uses the normal
+        approximation of the trinomial win/draw/loss model, so draws are handled without a draw-rate model.
+
+        Args:
+            elo0:   The Elo difference under H0.
+            elo1:   The Elo difference under H1.
+            alpha:  The probability of accepting H1 when H0 is true.
+            beta:   The probability of accepting H0 when H1 is true.
+
+        """
+        self.elo0, self.elo1 = elo0, elo1
+        self.alpha, self.beta = alpha, beta
+        self.lower = log(beta / (1 - alpha))
+        self.upper = log((1 - beta) / alpha)
+
+        self.wins = self.draws = self.losses = 0
+        self.errors = 0             # Games that could not be finished and are left out of the test.
+
+    def __repr__(self):
+        return ' '.join(["[", "W/D/L:", "%d/%d/%d" % (self.wins, self.draws, self.losses),
+                         "LLR:", "%.2f" % self.llr(), "(%.2f, %.2f)" % (self.lower, self.upper), "]"])
+
+    def add(self, score):
+        """ Records one game: 1 for a win of the first player, 0.5 for a draw, 0 for a loss. """
+        if score == 1:
+            self.wins += 1
+        elif score == 0:
+            self.losses += 1
+        else:
+            self.draws += 1
+
+    def llr(self):
+        games = self.wins + self.draws + self.losses
+        if not games:
+            return 0.
+        mean = score_stats(self.wins, self.draws, self.losses)[0]
+        # the sample variance of a few games can be near zero and decide the test far too early, so it is
+        # estimated with one extra win, draw and loss
+        variance = score_stats(self.wins + 1, self.draws + 1, self.losses + 1)[1]
+        s0, s1 = expected_score(self.elo0), expected_score(self.elo1)
+        return games * (s1 - s0) * (2 * mean - s0 - s1) / (2 * variance)
+
+    def status(self):
+        """ Returns:    'H1' or 'H0' once the test has accepted a hypothesis, otherwise None. """
+        llr = self.llr()
+        if llr >= self.upper:
+            return 'H1'
+        if llr <= self.lower:
+            return 'H0'
+        return None
@@ -1,6 +1,10 @@
 
 
 class MCTSNode:
+    # Fixed attribute slots instead of a per-instance __dict__, which matters for large trees.
+    __slots__ = ('parent', 'parent_action', 'child_nodes', 'untried_actions', 'wins', 'visits', 'proven',
+                 'amaf_wins', 'amaf_visits')
+
     def __init__(self, parent=None, parent_action=None, action_list=[]):
         """ Initializes the tree node for MCTS. The node stores links to other nodes in the tree (parent and child
         nodes), as well as keeps track of the number of wins and total simulations that have visited the node.
@@ -19,6 +23,10 @@ class MCTSNode:
 
         self.wins = 0                           # Total wins of all paths through this node.
         self.visits = 0                         # Number of times this node has been visited.
+        self.proven = None                      # Game result under perfect play once solved, as in Board.outcome.
+
+        self.amaf_wins = 0                      # RAVE: wins of simulations through the parent that played
+        self.amaf_visits = 0                    # parent_action at any later point, and their number.
 
     def __repr__(self):
         """
@@ -29,17 +37,22 @@ class MCTSNode:
                          "Visits:", str(self.visits),  "]"])
 
     def tree_to_string(self, horizon=1, indent=0):
-        """ This method returns a string of the tree down to a defined horizon. The string is recursively constructed.
+        """ This method returns a string of the tree down to a defined horizon.
 
         Args:
             horizon:    The cutoff depth for including tree nodes.
-            indent:     A recursive parameter that informs the process of how far a node should be indented.
+            indent:     How far the first node should be indented.
 
         Returns:        A string representing the tree to a given depth.
 
         """
-        string = ''.join(['| ' for i in range(indent)]) + str(self) + '\n'
-        if horizon > 0:
-            for child in self.child_nodes.values():
-                string += child.tree_to_string(horizon - 1, indent + 1)
-        return string
+        # walked with an explicit stack and joined once, so deep or wide trees cost neither recursion nor
+        # repeated string concatenation
+        lines = []
+        stack = [(self, indent)]
+        while stack:
+            node, depth = stack.pop()
+            lines.append('| ' * depth + str(node) + '\n')
+            if depth - indent < horizon:
+                stack.extend((child, depth + 1) for child in reversed(list(node.child_nodes.values())))
+        return ''.join(lines)
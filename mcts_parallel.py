@@ -0,0 +1,101 @@
+import atexit
+import multiprocessing
+import os
+import random
+import mcts_vanilla
+from mcts_node import MCTSNode
+
+num_workers = os.cpu_count() or 1
+
+_pool = None
+_pool_size = 0
+
+
+def get_pool(workers):
+    """ Returns the persistent worker pool, starting it (or restarting it with a new size) when needed, so that
+    a think call does not pay the process spawn cost.
+    """
+    global _pool, _pool_size
+    if _pool is None or _pool_size != workers:
+        shutdown()
+        _pool = multiprocessing.Pool(workers)
+        _pool_size = workers
+    return _pool
+
+
+def shutdown():
+    global _pool, _pool_size
+    if _pool is not None:
+        _pool.terminate()
+        _pool.join()
+        _pool, _pool_size = None, 0
+
+
+atexit.register(shutdown)
+
+
+def search_root(args):
+    """ Runs an independent search in a worker process.
+
+    Args:
+        args:   A (board, state, iterations, seconds, seed) tuple.
+
+    Returns:    Action -> (wins, visits, proven) dictionary of the root's children.
+    """
+    board, state, iterations, seconds, seed = args
+    random.seed(seed)
+    root_node = MCTSNode(parent=None, parent_action=None, action_list=mcts_vanilla.root_actions(board, state))
+    mcts_vanilla.search(board, state, root_node, iterations, seconds=seconds)
+    return dict((action, (child.wins, child.visits, child.proven))
+                for action, child in root_node.child_nodes.items())
+
+
+def merge(results):
+    """ Sums root child statistics from several searches into a fresh root node, so the usual
+    mcts_vanilla.select_action can pick from it. A proof is exact, so a child is proven if any worker proved it.
+    """
+    root_node = MCTSNode(parent=None, parent_action=None, action_list=[])
+    for result in results:
+        for action, (wins, visits, proven) in result.items():
+            child = root_node.child_nodes.get(action)
+            if child is None:
+                child = root_node.child_nodes[action] = MCTSNode(root_node, action, [])
+            child.wins += wins
+            child.visits += visits
+            root_node.visits += visits
+            if proven is not None:
+                child.proven = proven
+    return root_node
+
+
+def think(board, state, workers=None, iterations=None, seconds=None):
+    """ Root-parallel MCTS: each worker searches from state with its own seed, an equal share of the iteration
+    cap and the whole time limit, and the root statistics are merged before choosing the action.
+
+    Args:
+        board:      The game setup.
+        state:      The state of the game.
+        workers:    The number of worker processes, num_workers by default.
+        iterations: Optional cap on the total number of iterations, see mcts_vanilla.budget.
+        seconds:    Optional time limit for this move, see mcts_vanilla.budget.
+
+    Returns:    The action to be taken.
+    """
+    actions = mcts_vanilla.root_actions(board, state)
+    if len(actions) == 1:
+        print("Parallel bot picking %s, the only distinct action" % str(actions[0]))
+        return actions[0]
+
+    workers = workers or num_workers
+    iterations, seconds = mcts_vanilla.budget(iterations, seconds)
+    if iterations is None:
+        shares = [None] * workers
+    else:
+        shares = [iterations // workers + (i < iterations % workers) for i in range(workers)]
+    jobs = [(board, state, share, seconds, random.getrandbits(32)) for share in shares]
+
+    root_node = merge(get_pool(workers).map(search_root, jobs))
+
+    best_action, win_rate = mcts_vanilla.select_action(root_node, board.current_player(state))
+    print("Parallel bot picking %s with expected score %f (%d workers)" % (str(best_action), win_rate, workers))
+    return best_action
@@ -0,0 +1,351 @@
+import argparse
+import heapq
+import struct
+import sys
+from array import array
+from random import random
+from math import sqrt, log
+import p3_t3
+from p3_t3 import action_table, popcount_table, select_table
+from mcts_node import MCTSNode
+
+# A saved tree is a header, the level index and then the node arrays one after the other: parent, wins and
+# visits as 32-bit ints, and action and proven (as in Board.outcome, -1 while unknown) as signed bytes.
+# Everything is little-endian. Nodes are stored breadth first, so the nodes at depth d are the contiguous
+# range level[d] to level[d + 1], and a reader can seek straight to one level of each array. The header keeps
+# the root state packed by Board.state_to_int, so the tree can be replayed.
+header = struct.Struct('<4sHII24s')     # magic, version, number of nodes, number of levels, root state
+magic = b'P3TR'
+version = 2
+columns = ('parent', 'wins', 'visits', 'action', 'proven')
+
+
+class MCTSTree:
+    def __init__(self, untried=0):
+        """ A struct-of-arrays MCTS tree. Node i is described by entry i of each of the parallel arrays below, so
+        a tree of any size costs a handful of arrays instead of one object and one dict per node. Node 0 is the
+        root. The children of a node form a linked list through first_child and next_sibling.
+
+        Actions are stored as indices into p3_t3.action_table, and the untried actions of a node as a bitmask
+        in the format of Board.legal_action_bits.
+
+        Args:
+            untried:    The legal actions at the root as a bitmask.
+
+        """
+        self.parent = array('i')                # Index of the parent node - -1 for the root.
+        self.action = array('b')                # The move that got us to this node - -1 for the root.
+        self.wins = array('i')                  # Total wins of all paths through this node.
+        self.visits = array('i')                # Number of times this node has been visited.
+        self.proven = array('b')                # Game result under perfect play once solved, or -1.
+        self.first_child = array('i')           # Most recently added child, or -1.
+        self.next_sibling = array('i')          # Next child of the same parent, or -1.
+        self.untried = []                       # Bitmask of yet unexplored actions.
+
+        self.add_node(-1, -1, untried)
+
+    def __len__(self):
+        return len(self.parent)
+
+    def add_node(self, parent, action, untried):
+        """ Appends a node and links it into its parent's children.
+
+        Returns:    The index of the new node.
+        """
+        node = len(self.parent)
+        self.parent.append(parent)
+        self.action.append(action)
+        self.wins.append(0)
+        self.visits.append(0)
+        self.proven.append(-1)
+        self.first_child.append(-1)
+        self.untried.append(untried)
+        if parent < 0:
+            self.next_sibling.append(-1)
+        else:
+            self.next_sibling.append(self.first_child[parent])
+            self.first_child[parent] = node
+        return node
+
+    def children(self, node):
+        child = self.first_child[node]
+        while child >= 0:
+            yield child
+            child = self.next_sibling[child]
+
+    def child(self, node, action):
+        """ The child of node reached by the action index, or -1 if it has not been expanded. """
+        for child in self.children(node):
+            if self.action[child] == action:
+                return child
+        return -1
+
+    def tree_to_string(self, node=0, horizon=1):
+        """ The array counterpart of MCTSNode.tree_to_string, built with an explicit stack. """
+        lines = []
+        stack = [(node, 0)]
+        while stack:
+            node, depth = stack.pop()
+            action = action_table[self.action[node]] if self.action[node] >= 0 else None
+            win_rate = 100 * self.wins[node] / self.visits[node] if self.visits[node] else 0
+            lines.append('| ' * depth + ' '.join(["[", str(action), "Win rate:", "{0:.0f}%".format(win_rate),
+                                                  "Visits:", str(self.visits[node]), "]"]))
+            if depth < horizon:
+                stack.extend((child, depth + 1) for child in self.children(node))
+        return '\n'.join(lines) + '\n'
+
+
+def random_bit(bits):
+    """ Picks a set bit of an action bitmask uniformly at random and returns its index. """
+    k = int(random() * bin(bits).count('1'))
+    offset = 0
+    while True:
+        chunk = bits & 0x1ff
+        if k < popcount_table[chunk]:
+            return offset + select_table[chunk][k]
+        k -= popcount_table[chunk]
+        bits >>= 9
+        offset += 9
+
+
+def traverse_nodes(tree, node, board, state, identity, c=100):
+    """ Descends from node by UCB until reaching a node with untried actions or a finished game. Works like
+    mcts_vanilla.traverse_nodes, but iteratively on node indices, with the same selection rule: the bot picks the
+    child with the largest UCB_formula value and the opponent the one with the smallest.
+
+    Returns:    The reached node index, its state and the identity at that node.
+    """
+    wins, visits, next_sibling = tree.wins, tree.visits, tree.next_sibling
+    while not tree.untried[node] and tree.first_child[node] >= 0:
+        log_visits = log(visits[node])
+        best, best_value = -1, None
+        child = tree.first_child[node]
+        while child >= 0:
+            win_rate = wins[child] / visits[child]
+            value = (win_rate if identity else 1 - win_rate) + c * sqrt(log_visits / visits[child])
+            if best_value is None or (value > best_value if identity else value < best_value):
+                best, best_value = child, value
+            child = next_sibling[child]
+        node = best
+        state = board.next_state(state, action_table[tree.action[node]])
+        identity = not identity
+    return node, state, identity
+
+
+def expand_leaf(tree, node, board, state):
+    """ Adds a child for a random untried action of node.
+
+    Returns:    The new node index and its state, or node and state unchanged if nothing is left to try.
+    """
+    untried = tree.untried[node]
+    if not untried:
+        return node, state
+    action = random_bit(untried)
+    tree.untried[node] = untried & ~(1 << action)
+    state = board.next_state(state, action_table[action])
+    # a finished game has no moves to try, whatever cells are left on the board
+    untried = board.legal_action_bits(state) if board.outcome(state) is None else 0
+    return tree.add_node(node, action, untried), state
+
+
+def backpropagate(tree, node, won):
+    """ Adds a visit, and a win if won, to node and every ancestor. """
+    parent, wins, visits = tree.parent, tree.wins, tree.visits
+    while node >= 0:
+        visits[node] += 1
+        if won:
+            wins[node] += 1
+        node = parent[node]
+
+
+def action_index(action):
+    R, C, r, c = action
+    return 9 * (3 * R + C) + 3 * r + c
+
+
+def copy_node(tree, index, node):
+    tree.wins[index], tree.visits[index] = node.wins, node.visits
+    tree.proven[index] = -1 if node.proven is None else node.proven
+
+
+def bfs_tree(root_node):
+    """ Lays out an MCTSNode tree breadth first in an MCTSTree, without untried actions. The AMAF statistics
+    of RAVE are not kept, and a DAG built with a transposition table is rejected, since every node has a
+    single parent here.
+
+    Returns:    The tree and the level index: the first node of every depth, followed by the number of nodes.
+    """
+    tree = MCTSTree()
+    copy_node(tree, 0, root_node)
+    levels = [0, 1]
+    seen = set([id(root_node)])
+    current = [(root_node, 0)]
+    while current:
+        next_level = []
+        for node, index in current:
+            for action, child_node in node.child_nodes.items():
+                if id(child_node) in seen:
+                    raise ValueError("a tree with nodes shared through a transposition table cannot be saved")
+                seen.add(id(child_node))
+                child = tree.add_node(index, action_index(action), 0)
+                copy_node(tree, child, child_node)
+                next_level.append((child_node, child))
+        if next_level:
+            levels.append(len(tree))
+        current = next_level
+    return tree, levels
+
+
+def write_array(f, values):
+    """ Writes an array little-endian whatever the byte order of the machine. """
+    if sys.byteorder == 'big':
+        values = array(values.typecode, values)
+        values.byteswap()
+    values.tofile(f)
+
+
+def read_array(f, typecode, count):
+    """ Reads count little-endian items of typecode into a new array. """
+    values = array(typecode)
+    values.fromfile(f, count)
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+
+def save(path, board, state, root_node):
+    """ Writes the MCTSNode tree searched from state to path, see bfs_tree for what is not kept. """
+    tree, levels = bfs_tree(root_node)
+    with open(path, 'wb') as f:
+        f.write(header.pack(magic, version, len(tree), len(levels) - 1,
+                            board.state_to_int(state).to_bytes(24, 'little')))
+        write_array(f, array('I', levels))
+        for column in columns:
+            write_array(f, getattr(tree, column))
+
+
+def read_header(f):
+    """ Reads the header and level index of an open tree file.
+
+    Returns:    The number of nodes, the level index and the packed root state.
+    """
+    file_magic, file_version, nodes, depth, code = header.unpack(f.read(header.size))
+    if file_magic != magic or file_version != version:
+        raise ValueError("%s is not a version %d search tree" % (f.name, version))
+    return nodes, read_array(f, 'I', depth + 1), int.from_bytes(code, 'little')
+
+
+def load(path, board):
+    """ Reads a tree saved by save and replays it to fill in the untried actions of every node.
+
+    Returns:    The root state and the MCTSTree.
+    """
+    tree = MCTSTree()
+    with open(path, 'rb') as f:
+        nodes, levels, code = read_header(f)
+        for column in columns:
+            setattr(tree, column, read_array(f, getattr(tree, column).typecode, nodes))
+    state = board.int_to_state(code)
+
+    tree.first_child = array('i', [-1]) * nodes
+    tree.next_sibling = array('i', [-1]) * nodes
+    states = [state] + [None] * (nodes - 1)
+    tree.untried = [board.legal_action_bits(state)] + [0] * (nodes - 1)
+    for node in range(1, nodes):
+        parent = tree.parent[node]
+        tree.next_sibling[node] = tree.first_child[parent]
+        tree.first_child[parent] = node
+        tree.untried[parent] &= ~(1 << tree.action[node])
+        states[node] = board.next_state(states[parent], action_table[tree.action[node]])
+        if not board.is_ended(states[node]):
+            tree.untried[node] = board.legal_action_bits(states[node])
+    return state, tree
+
+
+def to_nodes(tree, board, state, actions=None):
+    """ Rebuilds an MCTSNode tree from an MCTSTree searched from state, so that mcts_vanilla can keep growing it.
+
+    Args:
+        actions:    The actions searched at the root, all legal actions by default.
+
+    Returns:    The root MCTSNode.
+    """
+    nodes = [MCTSNode(parent=None, parent_action=None,
+                      action_list=list(board.legal_actions(state) if actions is None else actions))]
+    states = [state]
+    for node in range(len(tree)):
+        if node:
+            parent_node = nodes[tree.parent[node]]
+            action = action_table[tree.action[node]]
+            states.append(board.next_state(states[tree.parent[node]], action))
+            result = board.outcome(states[node])
+            nodes.append(MCTSNode(parent_node, action, board.legal_actions(states[node]) if result is None else []))
+            parent_node.child_nodes[action] = nodes[node]
+            if action in parent_node.untried_actions:
+                parent_node.untried_actions.remove(action)
+        nodes[node].wins, nodes[node].visits = tree.wins[node], tree.visits[node]
+        if tree.proven[node] >= 0:
+            nodes[node].proven = tree.proven[node]
+    return nodes[0]
+
+
+def load_nodes(path, board, actions=None):
+    """ Reads a tree saved by save as MCTSNodes.
+
+    Returns:    The root state and the root MCTSNode.
+    """
+    state, tree = load(path, board)
+    return state, to_nodes(tree, board, state, actions)
+
+
+def top_k(path, depth, k=5):
+    """ Reads only the nodes at depth from a saved tree and picks the k most visited ones.
+
+    Returns:    A list of (visits, wins, action, node, parent) tuples, most visited first.
+    """
+    with open(path, 'rb') as f:
+        nodes, levels, code = read_header(f)
+        if depth >= len(levels) - 1:
+            return []
+        start, count = levels[depth], levels[depth + 1] - levels[depth]
+        offset = f.tell()
+        level = []
+        for typecode in ('i', 'i', 'i', 'b'):
+            size = array(typecode).itemsize
+            f.seek(offset + start * size)
+            level.append(read_array(f, typecode, count))
+            offset += nodes * size
+    parents, wins, visits, actions = level
+    best = heapq.nlargest(k, range(count), key=visits.__getitem__)
+    return [(visits[i], wins[i], action_table[actions[i]] if actions[i] >= 0 else None, start + i, parents[i])
+            for i in best]
+
+
+if __name__ == '__main__':
+    import mcts_vanilla
+
+    parser = argparse.ArgumentParser(description="Run, resume and inspect saved MCTS analysis trees.")
+    parser.add_argument('command', choices=('analyse', 'top'))
+    parser.add_argument('path', help="tree file")
+    parser.add_argument('--iterations', type=int, default=10000, help="iterations to add when analysing")
+    parser.add_argument('--resume', action='store_true', help="grow the tree saved in path instead of a new one")
+    parser.add_argument('--depth', type=int, default=1, help="depth of the nodes listed by top")
+    parser.add_argument('-k', type=int, default=10, help="number of nodes listed by top")
+    args = parser.parse_args()
+
+    board = p3_t3.Board()
+    if args.command == 'analyse':
+        if args.resume:
+            state, tree = load(args.path, board)
+            root_node = to_nodes(tree, board, state, mcts_vanilla.root_actions(board, state))
+        else:
+            state = board.starting_state()
+            root_node = MCTSNode(parent=None, parent_action=None,
+                                 action_list=mcts_vanilla.root_actions(board, state))
+        mcts_vanilla.think(board, state, args.iterations, root_node=root_node)
+        save(args.path, board, state, root_node)
+        print("Saved %d root visits to %s" % (root_node.visits, args.path))
+    else:
+        for visits, wins, action, node, parent in top_k(args.path, args.depth, args.k):
+            print("%-14s node %-8d parent %-8d visits %-8d win rate %.3f"
+                  % (str(action), node, parent, visits, wins / visits if visits else 0))
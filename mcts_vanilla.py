@@ -1,17 +1,39 @@
 from mcts_node import MCTSNode
+from transposition import TranspositionTable
+from search_stats import SearchStats
+from p3_t3 import popcount_table
+import mcts_tree
+import endgame
 from random import choice
 from math import sqrt, log, inf
+from itertools import count
+from threading import Thread, Event
+from timeit import default_timer as time
 
 num_nodes = 1000
 explore_faction = 2.
+transposition_capacity = 0      # Size of the transposition table, 0 to search a plain tree.
+time_limit = None               # Seconds per move. When set, think runs until it expires instead of num_nodes.
+profile = False                 # Whether think records a SearchStats into last_stats.
+last_stats = None               # SearchStats of the last profiled think call.
+solver = True                   # Whether proven results are propagated up the tree and solved subtrees skipped.
+endgame_cells = 8               # New nodes with at most this many empty cells are solved exactly, 0 to disable.
+merge_symmetries = True         # Whether the root only searches one of each set of symmetric actions.
+playout_policy = None           # Rollout policy from playout_policy, None for uniformly random moves.
+rave_equivalence = 0            # Visits at which RAVE and UCT estimates weigh the same, 0 to disable RAVE.
+rave_exploration = 1.           # Exploration constant of traverse_nodes with RAVE, in place of its usual 100.
+ponder_nodes = 100000           # Iterations a PonderingSearch spends at most on one turn of the opponent.
 
-def traverse_nodes(node, board, state, identity):
+def traverse_nodes(node, board, state, identity, path=None, table=None, rave=0):
     """ Traverses the tree until the end criterion are met.
     Args:
         node:       A tree node from which the search is traversing.
         board:      The game setup.
         state:      The state of the game.
         identity:   T/F of whether the bot is the current player. Used for minmax. 
+        path:       Optional list that each traversed child node is appended to.
+        table:      Optional TranspositionTable, told about every visited state.
+        rave:       The RAVE equivalence parameter, see UCB_formula.
 
     Returns:        A node from which the next stage of the search can proceed.
     """
@@ -23,44 +45,69 @@ def traverse_nodes(node, board, state, identity):
         return node, state
 
     node_to_traverse = None
+    action_to_traverse = None
     best_value = -inf if identity else inf
-    c = 100
+    c = rave_exploration if rave else 100
 
-    # select a child node to explore, depending on whose turn it is
+    # select a child node to explore, depending on whose turn it is. Solved children have nothing left to learn.
     for action, child_node in node.child_nodes.items():
-        value = UCB_formula(child_node, c, identity)
+        if solver and child_node.proven is not None:
+            continue
+        value = UCB_formula(child_node, c, identity, node, rave)
         if value > best_value and identity:
             best_value = value
             node_to_traverse = child_node
+            action_to_traverse = action
         elif value < best_value and not identity:
             best_value = value
             node_to_traverse = child_node
+            action_to_traverse = action
+
+    # every child is solved, but the proof has not reached this node yet (it is shared with another parent)
+    if node_to_traverse is None:
+        return node, state
 
     # NOTE: I changed identity to be a true/false value
     # because that way it is easy to tell if you are maxing out the UCB value or minimizing it
-    state = board.next_state(state, node_to_traverse.parent_action)
-    return traverse_nodes(node_to_traverse, board, state, not identity)
+    # the action comes from this node's child dict, since a shared node's parent_action may belong to another parent
+    state = board.next_state(state, action_to_traverse)
+    if path is not None:
+        path.append(node_to_traverse)
+    if table is not None:
+        table.touch(state)
+    return traverse_nodes(node_to_traverse, board, state, not identity, path, table, rave)
 
-def UCB_formula(node, c, identity):
+def UCB_formula(node, c, identity, parent=None, rave=0):
     """ A helper function for tree traversal - the upper confidence bound
     Args:
         node:   node that is in the tree (not the root)
         c:      value of exploration parameter
         identity: T/F of whether value should be calculated for the current player. 
+        parent: the node we are selecting from, defaults to node.parent (they differ for shared nodes)
+        rave:   the RAVE equivalence parameter k, 0 for plain UCT. The win rate is blended with the AMAF win rate
+                with weight sqrt(k / (3 * visits + k)), which trusts AMAF early and fades it out as visits grow.
     Returns:    the calculated UCB
     """
-    if not node.parent:
+    if parent is None:
+        parent = node.parent
+    if not parent:
         return 
+    win_rate = node.wins/node.visits
+    if rave and node.amaf_visits:
+        beta = sqrt(rave / (3 * node.visits + rave))
+        win_rate = (1 - beta) * win_rate + beta * node.amaf_wins / node.amaf_visits
     if not identity:
-        return (1-node.wins/node.visits) + c*sqrt(log(node.parent.visits)/node.visits) 
-    return node.wins/node.visits + c*sqrt(log(node.parent.visits)/node.visits)
+        return (1-win_rate) + c*sqrt(log(parent.visits)/node.visits) 
+    return win_rate + c*sqrt(log(parent.visits)/node.visits)
 
-def expand_leaf(node, board, state):
+def expand_leaf(node, board, state, table=None):
     """ Adds a new leaf to the tree by creating a new child node for the given node.
     Args:
         node:   The node for which a child will be added.
         board:  The game setup.
         state:  The state of the game.
+        table:  Optional TranspositionTable. If the new state is already in it, its node is linked in as the
+                child instead of creating a new one.
 
     Returns:    The added child node.
     """
@@ -74,10 +121,20 @@ def expand_leaf(node, board, state):
     # find all possible actions after that action is made
     # NOTE - board is now changed, bc move was tried and board is a reference
     state = board.next_state(state, random_action)
-    possible_actions = board.legal_actions(state)
 
-    # make tha fookin' node
-    child_node = MCTSNode(node, random_action, possible_actions)
+    # make tha fookin' node, unless this position was already reached by another move order
+    child_node = table.get(state) if table is not None else None
+    if child_node is None:
+        # a finished game has no moves to try, whatever cells are left on the board
+        result = board.outcome(state)
+        possible_actions = board.legal_actions(state) if result is None else []
+        child_node = MCTSNode(node, random_action, possible_actions)
+        if result is not None:
+            child_node.proven = result
+        elif solver and endgame_cells and endgame.empty_cells(state) <= endgame_cells:
+            child_node.proven = endgame.solve(board, state)
+        if table is not None:
+            table.put(state, child_node)
 
     # adjust parent node's untried action list and child node dict
     node.child_nodes[random_action] = child_node
@@ -86,26 +143,47 @@ def expand_leaf(node, board, state):
     return child_node, state
 
 
-def rollout(board, state):
+def rollout(board, state, policy=None, moves=None):
     """ Given the state of the game, the rollout plays out the remainder randomly.
     Args:
         board:  The game setup.
         state:  The state of the game.
+        policy: The playout policy that picks the moves, playout_policy by default.
+        moves:  Optional list that the played actions are appended to.
     """
-    # play until someone wins
-    while not board.is_ended(state):
-        actions = board.legal_actions(state)
-        random_action = choice(actions)
-        state = board.next_state(state, random_action)
-    return state
+    if policy is None:
+        policy = playout_policy
+
+    # play until someone wins, in place on a mutable copy of the state
+    game = board.mutable(state)
+    if moves is not None:
+        while not board.is_ended(game.state):
+            action = policy(board, game.state) if policy is not None else board.random_action(game.state)
+            moves.append(action)
+            game.make(action)
+    elif policy is None:
+        while not board.is_ended(game.state):
+            game.make(board.random_action(game.state))
+    else:
+        while not board.is_ended(game.state):
+            game.make(policy(board, game.state))
+    return game.snapshot()
 
 
-def backpropagate(node, condition):
+def backpropagate(node, condition, path=None):
     """ Navigates the tree from a leaf node to the root, updating the win and visit count of each node along the path.
     Args:
         node:   A leaf node.
         won:    An indicator of whether the bot won or lost the game.
+        path:   The nodes from the root to node. Nodes shared through a transposition table have several
+                parents, so the traversed path is updated instead of following parent links.
     """
+    if path is not None:
+        for node in path:
+            node.visits = node.visits + 1
+            if condition == 1:
+                node.wins = node.wins + 1
+        return
 
     # go through tree until root node's parent, which is None
     if condition == 1:
@@ -119,48 +197,443 @@ def backpropagate(node, condition):
             node.visits = node.visits + 1
             node = node.parent
 
-def think(board, state):
-    """ Performs MCTS by sampling games and calling the appropriate functions to construct the game tree.
+
+def update_amaf(path, moves, won):
+    """ Updates the AMAF statistics for a simulation: at every node on the path, each child whose action the
+    player to move there played at any later point of the simulation is counted as if it had been tried first.
     Args:
-        board:  The game setup.
-        state:  The state of the game.
+        path:   The nodes from the root down to the last expanded node.
+        moves:  The actions of the rollout that followed.
+        won:    Whether the bot won the simulation.
+    """
+    # the tree part of the simulation; parent_action can be another parent's move for nodes shared through a
+    # transposition table, which only blurs the statistics a little
+    moves = [node.parent_action for node in path[1:]] + moves
+    for depth in range(len(path)):
+        child_nodes = path[depth].child_nodes
+        # each cell is played at most once in a game, so there are no repeated actions to skip
+        for action in moves[depth::2]:
+            child_node = child_nodes.get(action)
+            if child_node is not None:
+                child_node.amaf_visits += 1
+                if won:
+                    child_node.amaf_wins += 1
 
-    Returns:    The action to be taken.
+
+def prove(path, player):
+    """ Propagates proven results up the traversed path, minimax-style: a node is won for the player to move
+    as soon as one child is, and otherwise solved once every action has been tried and every child solved.
+    Args:
+        path:   The nodes from the root down to the last expanded node.
+        player: The player to move at the root.
+    """
+    for depth in range(len(path) - 1, -1, -1):
+        node = path[depth]
+        if node.proven is None:
+            node.proven = proven_result(node, player if depth % 2 == 0 else 3 - player)
+            if node.proven is None:
+                return
+
+
+def proven_result(node, player):
+    """ Returns:    The result of node under perfect play as in Board.outcome, or None while it is unknown.
+    player is the player to move at node.
     """
+    unknown = draw = False
+    for child_node in node.child_nodes.values():
+        if child_node.proven == player:
+            return player
+        if child_node.proven is None:
+            unknown = True
+        elif child_node.proven == 0:
+            draw = True
+    if unknown or node.untried_actions:
+        return None
+    return 0 if draw else 3 - player
+
+
+def search(board, state, root_node, iterations, table=None, seconds=None, stats=None, policy=None, rave=0):
+    """ Runs MCTS iterations from root_node, growing the tree below it. Stops early once the budget is spent, the
+    most visited root child can no longer be overtaken in what is left of it, or the root is solved.
+    Args:
+        board:      The game setup.
+        state:      The state of the game at root_node.
+        root_node:  The root of the tree to grow.
+        iterations: The maximum number of iterations to run, or None for no cap.
+        table:      Optional TranspositionTable that turns the tree into a DAG.
+        seconds:    Optional number of seconds to search for.
+        stats:      Optional SearchStats to record phase timings and tree statistics into.
+        policy:     The playout policy of the rollouts, playout_policy by default.
+        rave:       The RAVE equivalence parameter, 0 for plain UCT. See UCB_formula.
 
+    Returns:        The number of iterations run.
+    """
     identity_of_bot = board.current_player(state)
-    root_node = MCTSNode(parent=None, parent_action=None, action_list=board.legal_actions(state))
+    start = time()
+    deadline = start + seconds if seconds is not None else None
+
+    # the phases are only wrapped in timers when profiling, so there is no cost otherwise
+    traverse, expand, play, update = traverse_nodes, expand_leaf, rollout, backpropagate
+    if stats is not None:
+        traverse, expand = stats.timed('traverse', traverse), stats.timed('expand', expand)
+        play, update = stats.timed('rollout', play), stats.timed('backpropagate', update)
+
+    # a root that endgame.solve proved when it was expanded has no children to pick an action from; they are all
+    # small enough to be solved on expansion too, so expanding them lets select_action pick the proven best
+    if root_node.proven is not None and not root_node.child_nodes:
+        while root_node.untried_actions:
+            expand_leaf(root_node, board, state, table)
+        return 0
+
+    for step in (count() if iterations is None else range(iterations)):
+        if solver and root_node.proven is not None:
+            return step
+
+        # every few iterations, see whether the budget is spent or the result is already decided
+        if step % 16 == 0 and step:
+            remaining = inf if iterations is None else iterations - step
+            if deadline is not None:
+                now = time()
+                if now >= deadline:
+                    return step
+                remaining = min(remaining, step * (deadline - now) / (now - start))
+            if decided(root_node, remaining):
+                return step
 
-    for step in range(num_nodes):
         # Copy the game for sampling a playthrough
         sampled_game = state
 
         # Start at root
         node = root_node
 
+        # with a transposition table nodes can have several parents, so remember the way down
+        path = [root_node] if table is not None or stats is not None or solver or rave else None
+        moves = [] if rave else None
+
         # Do MCTS lmaoooo
-        child_node, sampled_game = traverse_nodes(node, board, sampled_game, True)
-        expanded_node, sampled_game = expand_leaf(child_node, board, sampled_game)
-        sampled_game = rollout(board, sampled_game)
+        child_node, sampled_game = traverse(node, board, sampled_game, True, path, table, rave)
+        expanded_node, sampled_game = expand(child_node, board, sampled_game, table)
+        if path is not None and expanded_node is not child_node:
+            path.append(expanded_node)
+        leaf_game = sampled_game
+        # there is nothing to sample below a solved node
+        if expanded_node.proven is None:
+            sampled_game = play(board, sampled_game, policy, moves)
+
+        if stats is not None:
+            if expanded_node is not child_node and not expanded_node.visits:
+                stats.nodes_created += 1
+            stats.max_depth = max(stats.max_depth, len(path) - 1)
+            stats.depth_total += len(path) - 1
+            stats.rollout_moves += sum([popcount_table[mask] for mask in sampled_game[:18]]) \
+                - sum([popcount_table[mask] for mask in leaf_game[:18]])
 
         # check who won
-        # if node couldn't be expanded, mark down that it was visited but no win/loss.
-        # I'M NOT SURE IF THE ABOVE IS RIGHT BUT SOMETHING NEEDS TO HAPPEN ! 
-        # 0: node is an end point 1: player has won 2: player has lost
-        if not expanded_node.untried_actions:
-            backpropagate(expanded_node, 0)
-        elif board.points_values(sampled_game)[identity_of_bot] is 1:
-            backpropagate(expanded_node, 1)
+        # 1: player has won 2: player has lost or drawn. Finished games are proven nodes now, so they count
+        # with their real result instead of as a bare visit.
+        if expanded_node.proven is not None:
+            won = expanded_node.proven == identity_of_bot
         else:
-            backpropagate(expanded_node, 2)
+            won = board.points_values(sampled_game)[identity_of_bot] == 1
+        update(expanded_node, 1 if won else 2, path)
+        if rave:
+            update_amaf(path, moves, won)
+        if solver:
+            prove(path, identity_of_bot)
 
-    # select an action after MCTS has built the tree
+    return iterations
+
+
+def decided(root_node, remaining):
+    """ Whether the most visited root child stays the most visited whatever the next remaining iterations do. """
+    first = second = 0
+    for child_node in root_node.child_nodes.values():
+        if child_node.visits > first:
+            first, second = child_node.visits, first
+        elif child_node.visits > second:
+            second = child_node.visits
+    return first - second > remaining
+
+
+def select_action(root_node, player=None):
+    """ Picks the most visited root child after MCTS has built the tree, breaking ties by win rate. The visit
+    count is what search's early termination guarantees, and it is steadier than the win rate of a child that
+    was only sampled a few times. Given the player to move, children proven to win come first and children
+    proven to lose last, since solved children stop collecting visits.
+
+    Returns:    The action and its win rate.
+    """
     win_rate = 0
     best_action = None
-    for action, child_node in node.child_nodes.items():
-        child_node_wr = child_node.wins/child_node.visits
-        if child_node_wr > win_rate:
+    best_key = (-1, -1, 0)
+    for action, child_node in root_node.child_nodes.items():
+        child_node_wr = child_node.wins/child_node.visits if child_node.visits else 0
+        rank = 1
+        if player is not None and child_node.proven is not None and child_node.proven != 0:
+            rank = 2 if child_node.proven == player else 0
+        if (rank, child_node.visits, child_node_wr) > best_key:
+            best_key = (rank, child_node.visits, child_node_wr)
             win_rate = child_node_wr
             best_action = action
+    return best_action, win_rate
+
+
+def proven_message(result):
+    return "draw" if result == 0 else "player %d wins" % result
+
+
+def finish_stats(stats, root_node, steps):
+    """ Completes the SearchStats of a think call and publishes it as last_stats. """
+    global last_stats
+    if stats is None:
+        return
+    stats.thinks = 1
+    stats.iterations = steps
+    stats.root_visits = dict((action, child_node.visits) for action, child_node in root_node.child_nodes.items())
+    last_stats = stats
+
+
+def root_actions(board, state):
+    """ The actions to search at the root: with merge_symmetries, actions that lead to the same position up
+    to a symmetry of the board are searched once, so the empty board has 15 first moves instead of 81.
+    """
+    return board.unique_actions(state) if merge_symmetries else board.legal_actions(state)
+
+
+def budget(iterations, seconds):
+    """ Resolves the budget of a think call: an explicit time limit or the module's time_limit, and an explicit
+    iteration cap, or num_nodes when there is no time limit.
+
+    Returns:    The iteration cap (None for no cap) and the time limit (None for no limit).
+    """
+    if seconds is None:
+        seconds = time_limit
+    if iterations is None and seconds is None:
+        iterations = num_nodes
+    return iterations, seconds
+
+
+def think(board, state, iterations=None, seconds=None, policy=None, rave=None, root_node=None):
+    """ Performs MCTS by sampling games and calling the appropriate functions to construct the game tree.
+    Args:
+        board:      The game setup.
+        state:      The state of the game.
+        iterations: Optional cap on the number of iterations, see budget.
+        seconds:    Optional time limit for this move, see budget.
+        policy:     Optional playout policy, playout_policy by default.
+        rave:       Optional RAVE equivalence parameter, rave_equivalence by default.
+        root_node:  Optional tree for state to keep growing, such as one saved earlier and loaded with
+                    mcts_tree.load_nodes. The budget is spent on top of the visits it already has.
+
+    Returns:    The action to be taken.
+    """
+
+    actions = root_actions(board, state)
+    if len(actions) == 1:
+        print("Vanilla bot picking %s, the only distinct action" % str(actions[0]))
+        return actions[0]
+
+    iterations, seconds = budget(iterations, seconds)
+    if root_node is None:
+        root_node = MCTSNode(parent=None, parent_action=None, action_list=actions)
+    table = TranspositionTable(transposition_capacity) if transposition_capacity else None
+    stats = SearchStats() if profile else None
+    rave = rave_equivalence if rave is None else rave
+    steps = search(board, state, root_node, iterations, table, seconds, stats, policy, rave)
+    finish_stats(stats, root_node, steps)
+
+    best_action, win_rate = select_action(root_node, board.current_player(state))
+    print("Vanilla bot picking %s with expected score %f" % (str(best_action), win_rate))
+    if root_node.proven is not None:
+        print("Position solved: %s" % proven_message(root_node.proven))
+    if table is not None:
+        print("Transposition table %s" % table)
+    return best_action
+
+
+class Search:
+    def __init__(self):
+        """ A think that keeps its tree between moves. After picking an action it remembers the subtree under
+        that action, and on the next call re-roots at the grandchild matching the opponent's reply, so the
+        visits already spent there count towards num_nodes. Trees are kept per player, so one Search can play
+        both sides of a game.
+        """
+        self.trees = {}             # Player -> (state after our last action, node of that action)
+        self.tables = {}            # Player -> TranspositionTable kept across moves, if enabled
+        self.reused_visits = 0      # Visits inherited by the root of the last think call.
+
+    def reroot(self, board, state):
+        """ Finds the node for state below the remembered tree of the player to move, and detaches it so
+        the rest of the old tree can be freed.
+
+        Returns:    The node, or None if state was not reached from our last action.
+        """
+        previous = self.trees.pop(board.current_player(state), None)
+        if previous is None:
+            return None
+        previous_state, previous_node = previous
+
+        for action, child_node in previous_node.child_nodes.items():
+            if board.next_state(previous_state, action) == state:
+                child_node.parent = None
+                return child_node
+        return None
+
+    def think(self, board, state, iterations=None, seconds=None, policy=None, rave=None):
+        """ Performs MCTS like think, reusing the subtree from the previous move when there is one.
+        Args:
+            board:      The game setup.
+            state:      The state of the game.
+            iterations: Optional cap on the number of iterations, see budget. Reused visits count towards it.
+            seconds:    Optional time limit for this move, see budget.
+            policy:     Optional playout policy, playout_policy by default.
+            rave:       Optional RAVE equivalence parameter, rave_equivalence by default.
+
+        Returns:    The action to be taken.
+        """
+        root_node = self.reroot(board, state)
+        if root_node is None:
+            root_node = MCTSNode(parent=None, parent_action=None, action_list=root_actions(board, state))
+        self.reused_visits = root_node.visits
+
+        iterations, seconds = budget(iterations, seconds)
+        if iterations is not None:
+            iterations = max(iterations - root_node.visits, 0)
+
+        table = None
+        if transposition_capacity:
+            table = self.tables.get(board.current_player(state))
+            if table is None or table.capacity != transposition_capacity:
+                table = self.tables[board.current_player(state)] = TranspositionTable(transposition_capacity)
+            else:
+                table.retain(root_node)
+        stats = SearchStats() if profile else None
+        steps = 0
+        if len(root_node.untried_actions) + len(root_node.child_nodes) > 1:
+            rave = rave_equivalence if rave is None else rave
+            steps = search(board, state, root_node, iterations, table, seconds, stats, policy, rave)
+        elif root_node.untried_actions:
+            expand_leaf(root_node, board, state)
+        finish_stats(stats, root_node, steps)
+
+        best_action, win_rate = select_action(root_node, board.current_player(state))
+        if best_action is not None:
+            self.trees[board.current_player(state)] = (board.next_state(state, best_action),
+                                                      root_node.child_nodes[best_action])
+        print("Vanilla bot picking %s with expected score %f (reused %d visits)"
+              % (str(best_action), win_rate, self.reused_visits))
+        if root_node.proven is not None:
+            print("Position solved: %s" % proven_message(root_node.proven))
+        if table is not None:
+            print("Transposition table %s" % table)
+        return best_action
+
+
+class PonderingSearch(Search):
+    def __init__(self):
+        """ A Search that keeps thinking on the opponent's time. After picking an action it grows the subtree
+        under that action in a background thread until its next think call, which stops the thread and then
+        re-roots and tops up the budget like Search. Threads share the interpreter, so this pays off while the
+        opponent waits for input rather than searching itself.
+        """
+        super().__init__()
+        self.ponders = {}           # Player -> (thread, event that stops it, [iterations run])
+        self.pondered = 0           # Iterations pondered before the last think call.
+
+    def ponder(self, board, state, node, player, policy, rave, stopped, steps):
+        """ Grows the trees of every reply the opponent has in state, a short chunk of iterations each in turn,
+        until stopped is set, every reply is solved or ponder_nodes iterations are spent. Each reply is searched
+        as a root of its own rather than through node, so the opponent's unlikely moves get their share too.
+        """
+        table = self.tables.get(player) if transposition_capacity else None
+        while node.untried_actions:
+            expand_leaf(node, board, state, table)
+        replies = [(board.next_state(state, action), reply_node) for action, reply_node in node.child_nodes.items()]
+        while steps[0] < ponder_nodes and not stopped.is_set():
+            replies = [reply for reply in replies if reply[1].proven is None]
+            if not replies:
+                return
+            for reply_state, reply_node in replies:
+                if stopped.is_set():
+                    return
+                steps[0] += search(board, reply_state, reply_node, 32, table, policy=policy, rave=rave)
+
+    def stop(self, player=None):
+        """ Stops and waits for the pondering of player, or of both players.
+
+        Returns:    The number of iterations the stopped threads ran.
+        """
+        pondered = 0
+        for ponder_player in ([player] if player is not None else list(self.ponders)):
+            if ponder_player in self.ponders:
+                thread, stopped, steps = self.ponders.pop(ponder_player)
+                stopped.set()
+                thread.join()
+                pondered += steps[0]
+        return pondered
+
+    def think(self, board, state, iterations=None, seconds=None, policy=None, rave=None):
+        """ Performs MCTS like Search.think and then starts pondering on the tree it keeps.
+        Args:
+            board:      The game setup.
+            state:      The state of the game.
+            iterations: Optional cap on the number of iterations, see budget. Pondered visits count towards it.
+            seconds:    Optional time limit for this move, see budget.
+            policy:     Optional playout policy, playout_policy by default.
+            rave:       Optional RAVE equivalence parameter, rave_equivalence by default.
+
+        Returns:    The action to be taken.
+        """
+        player = board.current_player(state)
+        self.pondered = self.stop(player)
+        best_action = super().think(board, state, iterations, seconds, policy, rave)
+        print("Pondered %d iterations on the opponent's turn, the root started with %d visits"
+              % (self.pondered, self.reused_visits))
+
+        if player in self.trees and not board.is_ended(self.trees[player][0]):
+            next_state, node = self.trees[player]
+            # the rest of the old tree is garbage now
+            node.parent = None
+            stopped, steps = Event(), [0]
+            rave = rave_equivalence if rave is None else rave
+            thread = Thread(target=self.ponder, daemon=True,
+                            args=(board, next_state, node, player, policy, rave, stopped, steps))
+            self.ponders[player] = (thread, stopped, steps)
+            thread.start()
+        return best_action
+
+
+def think_array(board, state):
+    """ The plain UCT search of think, but the tree is kept in a struct-of-arrays mcts_tree.MCTSTree instead of
+    MCTSNode objects, which keeps memory and garbage collection flat for very large num_nodes. It always runs
+    num_nodes iterations over every legal action, without the solver, symmetry merging, early termination,
+    time limits, playout policies or RAVE of think.
+    Args:
+        board:  The game setup.
+        state:  The state of the game.
+
+    Returns:    The action to be taken.
+    """
+
+    identity_of_bot = board.current_player(state)
+    tree = mcts_tree.MCTSTree(board.legal_action_bits(state))
+
+    for step in range(num_nodes):
+        node, sampled_game, identity = mcts_tree.traverse_nodes(tree, 0, board, state, True)
+        node, sampled_game = mcts_tree.expand_leaf(tree, node, board, sampled_game)
+        sampled_game = rollout(board, sampled_game)
+
+        # as in think, a finished game counts with its real result
+        won = board.points_values(sampled_game)[identity_of_bot] == 1
+        mcts_tree.backpropagate(tree, node, won)
+
+    # select an action after MCTS has built the tree
+    win_rate = -1
+    best_action = None
+    for child in tree.children(0):
+        child_wr = tree.wins[child] / tree.visits[child]
+        if child_wr > win_rate:
+            win_rate = child_wr
+            best_action = mcts_tree.action_table[tree.action[child]]
     print("Vanilla bot picking %s with expected score %f" % (str(best_action), win_rate))
-    return best_action
\ No newline at end of file
+    return best_action
@@ -0,0 +1,150 @@
+import argparse
+import mmap
+import os
+import struct
+from timeit import default_timer as time
+import p3_t3
+import mcts_vanilla
+from mcts_node import MCTSNode
+
+# The book file is a header followed by fixed-size records sorted by key. The key is the canonical state (see
+# Board.canonical) packed by Board.state_to_int, written big-endian so that comparing the bytes compares the
+# states. The action is stored for the canonical state, as its index 9 * (3 * R + C) + (3 * r + c) in
+# p3_t3.action_table.
+header = struct.Struct('>4sHI')         # magic, version, number of records
+record = struct.Struct('>24sBII')       # key, action index, visits, wins
+magic = b'P3BK'
+version = 2
+
+default_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'opening_book.bin')
+
+board = p3_t3.Board()
+
+
+def state_key(state):
+    return board.state_to_int(state).to_bytes(24, 'big')
+
+
+def positions(plies):
+    """ Returns:    The canonical form of every unfinished position reachable from the starting state in at most
+                plies plies.
+    """
+    frontier = [board.starting_state()]
+    seen = set(frontier)
+    for ply in range(plies):
+        successors = []
+        for state in frontier:
+            for action in board.unique_actions(state):
+                successor = board.canonical(board.next_state(state, action))[0]
+                if successor not in seen and not board.is_ended(successor):
+                    seen.add(successor)
+                    successors.append(successor)
+        frontier = successors
+    return seen
+
+
+def build(path, plies=1, iterations=20000):
+    """ Runs a long search from every position within plies plies of the start and writes the chosen action and
+    its statistics to a book file.
+
+    Args:
+        path:       The file to write.
+        plies:      How deep into the game the book reaches.
+        iterations: MCTS iterations per position.
+
+    Returns:    The number of positions written.
+    """
+    entries = []
+    for state in positions(plies):
+        root_node = MCTSNode(parent=None, parent_action=None, action_list=mcts_vanilla.root_actions(board, state))
+        mcts_vanilla.search(board, state, root_node, iterations)
+        action, win_rate = mcts_vanilla.select_action(root_node, board.current_player(state))
+        child_node = root_node.child_nodes[action]
+        entries.append((state_key(state), p3_t3.action_indices[action], child_node.visits, child_node.wins))
+        print("Book: %d positions searched" % len(entries))
+
+    entries.sort()
+    with open(path, 'wb') as f:
+        f.write(header.pack(magic, version, len(entries)))
+        for entry in entries:
+            f.write(record.pack(*entry))
+    return len(entries)
+
+
+class OpeningBook:
+    def __init__(self, path=default_path):
+        """ Read-only access to a book file. The file is memory-mapped on the first lookup, and positions are
+        found by binary search over the sorted records, so nothing is parsed up front.
+        """
+        self.path = path
+        self.data = None
+        self.size = 0
+
+    def load(self):
+        """ Maps the file. A missing or empty file is no book, anything else that is not a whole book is an error.
+
+        Returns:    Whether a valid book is available.
+        """
+        if self.data is None:
+            if not os.path.exists(self.path) or not os.path.getsize(self.path):
+                return False
+            with open(self.path, 'rb') as f:
+                head = f.read(header.size)
+                if len(head) < header.size:
+                    raise ValueError("%s is too short for an opening book" % self.path)
+                file_magic, file_version, size = header.unpack(head)
+                if file_magic != magic or file_version != version:
+                    raise ValueError("%s is not a version %d opening book" % (self.path, version))
+                if os.path.getsize(self.path) < header.size + size * record.size:
+                    raise ValueError("%s is truncated: %d records expected" % (self.path, size))
+                self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self.size = size
+        return True
+
+    def lookup(self, state):
+        """ Returns:    The book's (action, visits, wins) for state, or None when it is out of book. """
+        if not self.load():
+            return None
+        state, transform = board.canonical(state)
+        key = state_key(state)
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            offset = header.size + middle * record.size
+            middle_key = self.data[offset:offset + 24]
+            if middle_key < key:
+                low = middle + 1
+            elif middle_key > key:
+                high = middle
+            else:
+                key, action, visits, wins = record.unpack_from(self.data, offset)
+                action = board.transform_action(p3_t3.action_table[action], p3_t3.inverse_transforms[transform])
+                return action, visits, wins
+        return None
+
+
+book = OpeningBook()
+
+
+def think(board, state):
+    """ Plays from the opening book while the position is in it, and falls back to mcts_vanilla.think. """
+    start = time()
+    entry = book.lookup(state)
+    if entry is None:
+        return mcts_vanilla.think(board, state)
+    action, visits, wins = entry
+    print("Book bot picking %s with expected score %f (%d visits, %.0f us)"
+          % (str(action), wins / visits, visits, 1e6 * (time() - start)))
+    return action
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build an opening book from deep MCTS searches.")
+    parser.add_argument('path', nargs='?', default=default_path, help="book file to write")
+    parser.add_argument('--plies', type=int, default=1, help="depth of the book in plies")
+    parser.add_argument('--iterations', type=int, default=20000, help="MCTS iterations per position")
+    args = parser.parse_args()
+
+    start = time()
+    count = build(args.path, args.plies, args.iterations)
+    print("Wrote %d positions to %s in %.1f seconds" % (count, args.path, time() - start))
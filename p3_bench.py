@@ -0,0 +1,315 @@
+import argparse
+import io
+import json
+import random
+import tracemalloc
+from functools import partial
+from contextlib import redirect_stdout
+from timeit import default_timer as time
+import p3_t3
+import mcts_vanilla
+import mcts_parallel
+import playout_policy
+import rollout_bot
+
+board = p3_t3.Board()
+state0 = board.starting_state()
+
+# Midgame positions reached by seeded random play after 8, 16, 24 and 32 plies.
+midgame_states = [
+    (0, 0, 0, 0, 0, 24, 68, 2, 12, 0, 0, 0, 0, 16, 0, 0, 0, 0, 0, 0, 0, 1, 1),
+    (4, 320, 1, 32, 0, 9, 2, 272, 1, 0, 128, 0, 12, 0, 0, 64, 8, 0, 0, 0, 2, 2, 1),
+    (0, 32, 0, 146, 0, 0, 32, 256, 290, 0, 138, 304, 32, 0, 258, 16, 257, 224, 0, 2, None, None, 1),
+    (0, 72, 33, 10, 0, 128, 140, 290, 16, 168, 274, 132, 33, 0, 154, 32, 256, 80, 128, 0, 0, 2, 1),
+]
+
+# Perft node counts at depths 1 to 5, computed with the original loop-based Board. Any change to move generation
+# or move application must reproduce them exactly.
+perft_counts = {
+    'start': [81, 720, 6336, 55080, 473256],
+    'mid8': [9, 72, 576, 4604, 36480],
+    'mid16': [8, 58, 411, 2916, 20729],
+    'mid24': [51, 567, 6038, 62112, 615773],
+    'mid32': [8, 44, 427, 3757, 33910],
+}
+perft_states = dict(zip(perft_counts, [state0] + midgame_states))
+
+
+def perft(state, depth):
+    """ Counts the positions reached by every sequence of depth legal actions from state. Finished games are not
+    played on, so they only count at depth 0. The last ply is counted from legal_actions without applying it.
+    """
+    if depth == 0:
+        return 1
+    if board.is_ended(state):
+        return 0
+    if depth == 1:
+        return len(board.legal_actions(state))
+    return sum(perft(board.next_state(state, action), depth - 1) for action in board.legal_actions(state))
+
+
+def bench_perft(depth=4):
+    """ Runs perft to depth from the starting state and each stored midgame position.
+
+    Returns:    Node counts and nodes per second for each position.
+    """
+    results = {}
+    for name, state in perft_states.items():
+        start = time()
+        nodes = perft(state, depth)
+        elapsed = time() - start
+        results['%s.%d.nodes' % (name, depth)] = nodes
+        results['%s.%d.nodes_per_second' % (name, depth)] = nodes / elapsed
+    return results
+
+
+def bench_rollout(seconds=3.0):
+    """ Plays random games from the starting state with mcts_vanilla.rollout for a fixed amount of time. """
+    random.seed(0)
+    playouts = 0
+    start = time()
+    while time() - start < seconds:
+        mcts_vanilla.rollout(board, state0)
+        playouts += 1
+    return {'playouts_per_second': playouts / (time() - start)}
+
+
+def bench_playout_policy(seconds=3.0):
+    """ Plays rollouts from the starting state with each playout policy for a fixed amount of time. """
+    results = {}
+    for name in ('uniform', 'heuristic'):
+        random.seed(0)
+        playouts = 0
+        start = time()
+        while time() - start < seconds:
+            mcts_vanilla.rollout(board, state0, getattr(playout_policy, name))
+            playouts += 1
+        results[name + '.playouts_per_second'] = playouts / (time() - start)
+    return results
+
+
+def bench_policy_match(games=20, move_seconds=0.05):
+    """ Plays mcts_vanilla with heuristic playouts against mcts_vanilla with uniform playouts, both thinking for
+    move_seconds per move and alternating who moves first.
+
+    Returns:    The heuristic player's mean score per game, from 0 for all losses to 1 for all wins.
+    """
+    heuristic = partial(mcts_vanilla.think, seconds=move_seconds, policy=playout_policy.heuristic)
+    uniform = partial(mcts_vanilla.think, seconds=move_seconds, policy=playout_policy.uniform)
+    random.seed(0)
+    score = 0.
+    for game in range(games):
+        state = state0
+        players = [heuristic, uniform] if game % 2 == 0 else [uniform, heuristic]
+        while not board.is_ended(state):
+            state = board.next_state(state, players[board.current_player(state) - 1](board, state))
+        heuristic_player = 1 if game % 2 == 0 else 2
+        score += (board.points_values(state)[heuristic_player] + 1) / 2.
+    return {'heuristic_score': score / games}
+
+
+def bench_rollout_tuple(seconds=3.0):
+    """ The same random playouts as bench_rollout, but allocating a new state tuple with Board.next_state
+    on every move instead of playing in place on a mutable board.
+    """
+    random.seed(0)
+    playouts = 0
+    start = time()
+    while time() - start < seconds:
+        state = state0
+        while not board.is_ended(state):
+            state = board.next_state(state, board.random_action(state))
+        playouts += 1
+    return {'playouts_per_second': playouts / (time() - start)}
+
+
+def bench_batch_rollout(sizes=(1, 64, 1024), seconds=3.0):
+    """ Plays random games from the starting state with batch_rollout, K games per call, for a fixed amount of
+    time per batch size. Compare with bench_rollout for the scalar rate. Needs numpy.
+    """
+    import numpy as np
+    import batch_rollout
+
+    rng = np.random.default_rng(0)
+    results = {}
+    for k in sizes:
+        states = [state0] * k
+        games = 0
+        start = time()
+        while time() - start < seconds:
+            batch_rollout.batch_rollout(states, rng)
+            games += k
+        results['%d.games_per_second' % k] = games / (time() - start)
+    return results
+
+
+def bench_think(think=mcts_vanilla.think, iterations=2000):
+    """ Times one think call from the starting state with num_nodes set to iterations, then repeats it under
+    tracemalloc to measure the peak memory of the search.
+    """
+    saved, mcts_vanilla.num_nodes = mcts_vanilla.num_nodes, iterations
+    try:
+        random.seed(0)
+        start = time()
+        think(board, state0)
+        elapsed = time() - start
+
+        random.seed(0)
+        tracemalloc.start()
+        try:
+            think(board, state0)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    finally:
+        mcts_vanilla.num_nodes = saved
+    return {'iterations_per_second': iterations / elapsed, 'peak_bytes': peak}
+
+
+def bench_think_array():
+    """ Times think_array next to think with the solver and symmetry merging off, which is the same plain UCT
+    search on MCTSNode objects, so the plain_think figures are the ones to compare it with.
+    """
+    saved = mcts_vanilla.solver, mcts_vanilla.merge_symmetries
+    mcts_vanilla.solver = mcts_vanilla.merge_symmetries = False
+    try:
+        plain = bench_think()
+    finally:
+        mcts_vanilla.solver, mcts_vanilla.merge_symmetries = saved
+    results = bench_think(mcts_vanilla.think_array)
+    results.update(('plain_think.' + name, value) for name, value in plain.items())
+    return results
+
+
+def bench_parallel(iterations=4000):
+    """ Times mcts_parallel.think from the starting state with 1 up to num_workers worker processes, using the
+    same total number of iterations each time. The pools are warmed up first so spawn cost is not counted.
+    """
+    random.seed(0)
+    results = {}
+    try:
+        for workers in range(1, mcts_parallel.num_workers + 1):
+            mcts_parallel.get_pool(workers)
+            start = time()
+            mcts_parallel.think(board, state0, workers, iterations)
+            results['%d.iterations_per_second' % workers] = iterations / (time() - start)
+    finally:
+        mcts_parallel.shutdown()
+    return results
+
+
+def bench_rollout_bot(moves=5):
+    """ Times rollout_bot.think from the starting state, where the branching factor is largest. """
+    random.seed(0)
+    start = time()
+    for i in range(moves):
+        rollout_bot.think(board, state0)
+    return {'latency_seconds': (time() - start) / moves}
+
+
+def bench_rollout_adaptive(moves=5):
+    """ Times rollout_bot.think_adaptive from the starting state and reports the playouts it spent per move. """
+    random.seed(0)
+    start = time()
+    for i in range(moves):
+        rollout_bot.think_adaptive(board, state0)
+    return {'latency_seconds': (time() - start) / moves,
+            'playouts': sum(rollout_bot.last_allocation.values())}
+
+
+benchmarks = dict(
+    perft=bench_perft,
+    rollout=bench_rollout,
+    rollout_tuple=bench_rollout_tuple,
+    playout_policy=bench_playout_policy,
+    policy_match=bench_policy_match,
+    batch_rollout=bench_batch_rollout,
+    think=bench_think,
+    think_array=bench_think_array,
+    parallel=bench_parallel,
+    rollout_bot=bench_rollout_bot,
+    rollout_adaptive=bench_rollout_adaptive,
+)
+
+
+def run(names):
+    """ Runs the named benchmarks with the bots' output silenced.
+
+    Returns:    A flat 'benchmark.metric' -> value dictionary.
+    """
+    results = {}
+    for name in names:
+        try:
+            with redirect_stdout(io.StringIO()):
+                metrics = benchmarks[name]()
+        except ImportError as e:
+            print("Skipping %s: %s" % (name, e))
+            continue
+        for metric, value in metrics.items():
+            results[name + '.' + metric] = value
+    return results
+
+
+def check_perft(results):
+    """ Returns:    A message for every perft count that differs from perft_counts. """
+    problems = []
+    for key, value in results.items():
+        parts = key.split('.')
+        if parts[0] == 'perft' and parts[-1] == 'nodes':
+            expected = perft_counts[parts[1]][int(parts[2]) - 1]
+            if value != expected:
+                problems.append("%s: %d nodes, expected %d" % (key, value, expected))
+    return problems
+
+
+def compare(results, baseline, tolerance):
+    """ Flags metrics that got worse than the baseline by more than the tolerance, read from the metric name:
+    rates (per_second) should not drop, times (seconds) and memory (bytes) should not grow, and node counts
+    must match exactly.
+
+    Returns:    A message for every regression.
+    """
+    problems = []
+    for key, value in sorted(results.items()):
+        if key not in baseline:
+            continue
+        old = baseline[key]
+        if key.endswith('per_second') and value < old * (1 - tolerance):
+            problems.append("%s: %.1f, baseline %.1f (%+.0f%%)" % (key, value, old, 100. * (value - old) / old))
+        elif key.endswith(('seconds', 'bytes')) and value > old * (1 + tolerance):
+            problems.append("%s: %.4g, baseline %.4g (%+.0f%%)" % (key, value, old, 100. * (value - old) / old))
+        elif key.endswith('nodes') and value != old:
+            problems.append("%s: %d, baseline %d" % (key, value, old))
+    return problems
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the game engine and the bots.")
+    parser.add_argument('names', nargs='*', help="benchmarks to run, all by default: " + ", ".join(benchmarks))
+    parser.add_argument('--json', default=None, help="write the results to this JSON file")
+    parser.add_argument('--compare', default=None, help="JSON results of an earlier run to check against")
+    parser.add_argument('--tolerance', type=float, default=0.1, help="allowed relative slowdown, 0.1 for 10%%")
+    args = parser.parse_args()
+
+    names = args.names or list(benchmarks)
+    for name in names:
+        if name not in benchmarks:
+            print(name + " not in " + ",".join(benchmarks))
+            exit(1)
+
+    results = run(names)
+    for key, value in sorted(results.items()):
+        print("%-40s %s" % (key, value))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    problems = check_perft(results)
+    if args.compare:
+        with open(args.compare) as f:
+            problems += compare(results, json.load(f), args.tolerance)
+    for problem in problems:
+        print("REGRESSION " + problem)
+    if problems:
+        exit(3)
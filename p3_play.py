@@ -1,6 +1,10 @@
 import sys
+from functools import partial
 import p3_t3
 import mcts_vanilla
+import playout_policy
+import mcts_parallel
+import opening_book
 import mcts_modified
 import random_bot
 import rollout_bot
@@ -20,36 +24,48 @@ players = dict(
     human=get_human_input,
     random_bot=random_bot.think,
     rollout_bot=rollout_bot.think,
+    rollout_adaptive=rollout_bot.think_adaptive,
     mcts_vanilla=mcts_vanilla.think,
+    mcts_heuristic=partial(mcts_vanilla.think, policy=playout_policy.heuristic),
+    mcts_rave=partial(mcts_vanilla.think, rave=300),
+    mcts_reuse=mcts_vanilla.Search().think,
+    mcts_ponder=mcts_vanilla.PonderingSearch().think,
+    mcts_parallel=mcts_parallel.think,
+    mcts_book=opening_book.think,
     mcts_modified=mcts_modified.think
 )
 
-board = p3_t3.Board()
-state0 = board.starting_state()
+# Worker processes of mcts_parallel may re-import this module, so only play when run as a script.
+if __name__ == '__main__':
+    board = p3_t3.Board()
+    state0 = board.starting_state()
 
-if len(sys.argv) != 3:
-    print("Need two player arguments")
-    exit(1)
+    if len(sys.argv) != 3:
+        print("Need two player arguments")
+        exit(1)
 
-p1 = sys.argv[1]
-if p1 not in players:
-    print("p1 not in "+players.keys().join(","))
-    exit(1)
-p2 = sys.argv[2]
-if p2 not in players:
-    print("p2 not in "+players.keys().join(","))
-    exit(1)
+    p1 = sys.argv[1]
+    if p1 not in players:
+        print("p1 not in "+",".join(players))
+        exit(1)
+    p2 = sys.argv[2]
+    if p2 not in players:
+        print("p2 not in "+",".join(players))
+        exit(1)
 
-player1 = players[p1]
-player2 = players[p2]
-state = state0
-last_action = None
-current_player = player1
-while not board.is_ended(state):
-    print(board.display(state, last_action))
-    print("Player "+str(board.current_player(state)))
-    last_action = current_player(board, state)
-    state = board.next_state(state, last_action)
-    current_player = player1 if current_player == player2 else player2
-print("Finished!")
-print(board.points_values(state))
+    player1 = players[p1]
+    player2 = players[p2]
+    # each seat of a pondering bot playing itself gets its own search to ponder on
+    if p1 == p2 == 'mcts_ponder':
+        player2 = mcts_vanilla.PonderingSearch().think
+    state = state0
+    last_action = None
+    current_player = player1
+    while not board.is_ended(state):
+        print(board.display(state, last_action))
+        print("Player "+str(board.current_player(state)))
+        last_action = current_player(board, state)
+        state = board.next_state(state, last_action)
+        current_player = player1 if current_player == player2 else player2
+    print("Finished!")
+    print(board.points_values(state))
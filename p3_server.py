@@ -0,0 +1,339 @@
+import argparse
+import asyncio
+import io
+import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from itertools import count
+from timeit import default_timer as time
+import p3_t3
+import p3_play
+
+# The protocol is one JSON object per line in both directions. States travel in the format of
+# Board.unpack_state / Board.pack_state and moves in the "R C r c" notation of Board.unpack_action.
+#
+# Client to server:
+#   {"type": "new_game", "opponent": <bot name>, "seat": 1 or 2}
+#   {"type": "move", "game": <id>, "move": "R C r c"}
+#   {"type": "stats"}
+# Server to client:
+#   {"type": "state", "game": <id>, "state": <state>, "last_move": <move or null>, "your_turn": true}
+#   {"type": "end", "game": <id>, "state": <state>, "points": {"1": .., "2": ..}, "reason": .., "latency": ..}
+#   {"type": "stats", ...} and {"type": "error", "message": ..}
+
+board = p3_t3.Board()
+# a pondering bot would keep searching in its worker after every move, whatever game comes next, and
+# mcts_modified is the unfinished assignment template that returns no move
+bots = dict((name, think) for name, think in p3_play.players.items()
+            if name not in ('human', 'mcts_ponder', 'mcts_modified'))
+
+
+def bot_move(name, state):
+    """ Runs a bot's think in a worker process with its output silenced. """
+    with redirect_stdout(io.StringIO()):
+        return bots[name](board, state)
+
+
+class LatencyStats:
+    def __init__(self):
+        """ Move latencies in seconds, summarized as count, mean, median, 95th percentile and maximum. """
+        self.samples = []
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+
+    def summary(self):
+        if not self.samples:
+            return dict(count=0)
+        samples = sorted(self.samples)
+        return dict(count=len(samples), mean=sum(samples) / len(samples), p50=samples[len(samples) // 2],
+                    p95=samples[int(0.95 * (len(samples) - 1))], max=samples[-1])
+
+
+class Game:
+    def __init__(self, game_id, opponent, seat, send):
+        """ A game between a connected client in seat and a bot. """
+        self.id = game_id
+        self.opponent = opponent
+        self.seat = seat                    # The client's player number.
+        self.send = send                    # Coroutine function that sends a message to the client.
+        self.state = board.starting_state()
+        self.last_action = None
+        self.asked = None                   # When the client was last asked for a move.
+        self.timer = None                   # Handle of the pending move time-out.
+        self.finished = False
+        self.latency = dict(bot=LatencyStats(), client=LatencyStats())
+
+
+class MatchServer:
+    def __init__(self, workers=None, move_seconds=30.):
+        """ Hosts games between clients and bots. Every bot move runs in a process pool, so a long search only
+        holds up its own game, and every move of either side has move_seconds to arrive: a bot that is late
+        is replaced by a random legal move, as is a bot move that is illegal or raised, and a client that is late
+        forfeits. A late bot's search still runs to
+        the end in its worker, so move_seconds should leave room for the slowest bot being played.
+        """
+        # forked workers would inherit the open sockets and keep closed connections alive, so spawn them
+        self.pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'))
+        self.move_seconds = move_seconds
+        self.games = {}
+        self.connections = set()            # Tasks serving the open connections.
+        self.ids = count(1)
+        self.finished = 0
+        self.timeouts = dict(bot=0, client=0)
+        self.bot_errors = 0                 # Bot moves that raised or were illegal and were replaced.
+        self.latency = dict(bot=LatencyStats(), client=LatencyStats())
+
+    async def close(self):
+        """ Waits for the clients to hang up and stops the worker processes. """
+        if self.connections:
+            await asyncio.wait(self.connections)
+        self.pool.shutdown(cancel_futures=True)
+
+    def stats(self):
+        return dict(type='stats', games=len(self.games), finished=self.finished, timeouts=self.timeouts,
+                    bot_errors=self.bot_errors,
+                    latency=dict((side, stats.summary()) for side, stats in self.latency.items()))
+
+    async def handle(self, reader, writer):
+        """ Serves one connection. Every message is handled in its own task, so one connection can play many
+        games at once.
+        """
+        async def send(message):
+            writer.write((json.dumps(message) + '\n').encode())
+            await writer.drain()
+
+        tasks = set()
+        self.connections.add(asyncio.current_task())
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                task = asyncio.create_task(self.dispatch(line, send))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        finally:
+            for game in [game for game in self.games.values() if game.send is send]:
+                await self.end(game, None, "disconnected")
+            writer.close()
+            self.connections.discard(asyncio.current_task())
+
+    async def dispatch(self, line, send):
+        try:
+            message = json.loads(line)
+            kind = message.get('type')
+            if kind == 'new_game':
+                await self.new_game(message, send)
+            elif kind == 'move':
+                await self.client_move(message, send)
+            elif kind == 'stats':
+                await send(self.stats())
+            else:
+                await send(dict(type='error', message="unknown message type %r" % kind))
+        except (ValueError, KeyError, TypeError) as e:
+            await send(dict(type='error', message=repr(e)))
+        except ConnectionError:
+            pass
+
+    async def new_game(self, message, send):
+        opponent, seat = message['opponent'], int(message.get('seat', 1))
+        if opponent not in bots or seat not in (1, 2):
+            await send(dict(type='error', message="opponent must be one of %s and seat 1 or 2" % ", ".join(bots)))
+            return
+        game = Game(next(self.ids), opponent, seat, send)
+        self.games[game.id] = game
+        if seat == 2:
+            await self.bot_turn(game)
+        await self.ask(game)
+
+    async def client_move(self, message, send):
+        game = self.games.get(message['game'])
+        if game is None or game.send is not send:
+            await send(dict(type='error', message="no such game %r" % message['game']))
+            return
+        action = board.pack_action(message['move'])
+        if board.current_player(game.state) != game.seat or game.asked is None:
+            await send(dict(type='error', game=game.id, message="not your turn"))
+            return
+        if action is None or not board.is_legal(game.state, action):
+            await send(dict(type='error', game=game.id, message="illegal move %r" % message['move']))
+            return
+
+        game.timer.cancel()
+        elapsed = time() - game.asked
+        game.asked = None
+        game.latency['client'].add(elapsed)
+        self.latency['client'].add(elapsed)
+        self.play(game, action)
+        await self.bot_turn(game)
+        await self.ask(game)
+
+    async def bot_turn(self, game):
+        """ Plays the bot's move unless the game is over. """
+        if game.finished or board.is_ended(game.state):
+            return
+        start = time()
+        future = asyncio.get_running_loop().run_in_executor(self.pool, bot_move, game.opponent, game.state)
+        try:
+            action = await asyncio.wait_for(future, self.move_seconds)
+        except asyncio.TimeoutError:
+            self.timeouts['bot'] += 1
+            action = board.random_action(game.state)
+        except Exception:
+            action = None
+        if game.finished:
+            return
+        if action not in board.legal_actions(game.state):
+            self.bot_errors += 1
+            action = board.random_action(game.state)
+        elapsed = time() - start
+        game.latency['bot'].add(elapsed)
+        self.latency['bot'].add(elapsed)
+        self.play(game, action)
+
+    def play(self, game, action):
+        game.state = board.next_state(game.state, action)
+        game.last_action = action
+
+    async def ask(self, game):
+        """ Sends the client the position, either to ask for its move or because the game is over. """
+        if game.finished:
+            return
+        if board.is_ended(game.state):
+            await self.end(game, board.points_values(game.state), "finished")
+            return
+        game.asked = time()
+        game.timer = asyncio.get_running_loop().call_later(self.move_seconds, self.forfeit, game)
+        await game.send(dict(type='state', game=game.id, state=board.unpack_state(game.state),
+                             last_move=board.unpack_action(game.last_action) if game.last_action else None,
+                             your_turn=True))
+
+    def forfeit(self, game):
+        self.timeouts['client'] += 1
+        points = {game.seat: -1, 3 - game.seat: 1}
+        asyncio.ensure_future(self.end(game, points, "client ran out of time"))
+
+    async def end(self, game, points, reason):
+        """ Closes a game and sends the client its result, unless points is None because the client is gone. """
+        if game.finished:
+            return
+        game.finished = True
+        if game.timer is not None:
+            game.timer.cancel()
+        del self.games[game.id]
+        self.finished += 1
+        if points is not None:
+            await game.send(dict(type='end', game=game.id, state=board.unpack_state(game.state), points=points,
+                              reason=reason,
+                              latency=dict((side, stats.summary()) for side, stats in game.latency.items())))
+
+
+async def connect(host, port, unix):
+    if unix:
+        return await asyncio.open_unix_connection(unix)
+    return await asyncio.open_connection(host, port)
+
+
+async def stand_in_client(host, port, unix, opponent, seat, choose=None):
+    """ Plays one game against opponent over its own connection, choosing moves with choose(state), a random
+    legal move by default.
+
+    Returns:    The final message of the game.
+    """
+    reader, writer = await connect(host, port, unix)
+
+    async def send(message):
+        writer.write((json.dumps(message) + '\n').encode())
+        await writer.drain()
+
+    try:
+        await send(dict(type='new_game', opponent=opponent, seat=seat))
+        while True:
+            line = await reader.readline()
+            if not line:
+                raise ConnectionError("server closed the connection")
+            message = json.loads(line)
+            if message['type'] == 'state':
+                state = board.pack_state(message['state'])
+                action = choose(state) if choose else board.random_action(state)
+                await send(dict(type='move', game=message['game'], move=board.unpack_action(action)))
+            elif message['type'] == 'end':
+                return message
+            elif message['type'] == 'error':
+                raise ValueError(message['message'])
+    finally:
+        writer.close()
+        await writer.wait_closed()
+
+
+def human_move(state):
+    print(board.display(state, None))
+    while True:
+        action = board.pack_action(input("Which move? BoardY BoardX SquareY SquareX ").strip())
+        if action is not None and board.is_legal(state, action):
+            return action
+        print("Please input a legal move as space-separated numbers.")
+
+
+async def serve(host, port, unix, workers, move_seconds):
+    server = MatchServer(workers, move_seconds)
+    if unix:
+        listener = await asyncio.start_unix_server(server.handle, unix)
+    else:
+        listener = await asyncio.start_server(server.handle, host, port)
+    print("Serving on %s" % (unix or "%s:%d" % (host, port)))
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        server.pool.shutdown(cancel_futures=True)
+
+
+async def selftest(games, opponent, workers, move_seconds):
+    """ Starts a server on a free local port and plays games stand-in clients against it at once. """
+    server = MatchServer(workers, move_seconds)
+    listener = await asyncio.start_server(server.handle, '127.0.0.1', 0)
+    port = listener.sockets[0].getsockname()[1]
+    start = time()
+    try:
+        results = await asyncio.gather(*[stand_in_client('127.0.0.1', port, None, opponent, 1 + i % 2)
+                                         for i in range(games)])
+    finally:
+        listener.close()
+        await server.close()
+        await listener.wait_closed()
+
+    outcomes = {}
+    for i, result in enumerate(results):
+        points = result['points'][str(1 + i % 2)]
+        outcomes[points] = outcomes.get(points, 0) + 1
+    print("Played %d games in %.1f seconds; client points: %s" % (games, time() - start, outcomes))
+    print(json.dumps(server.stats(), indent=2))
+    return server.stats()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Host games between clients and bots.")
+    parser.add_argument('command', choices=('serve', 'client', 'selftest'))
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', default=None, help="Unix socket path to use instead of TCP")
+    parser.add_argument('--workers', type=int, default=None, help="processes for bot moves")
+    parser.add_argument('--move-seconds', type=float, default=30., help="time limit per move")
+    parser.add_argument('--opponent', default='random_bot', help="bot to play: " + ", ".join(bots))
+    parser.add_argument('--seat', type=int, default=1, help="the client's player number")
+    parser.add_argument('--human', action='store_true', help="let the client enter moves by hand")
+    parser.add_argument('--games', type=int, default=100, help="concurrent games of the self-test")
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        asyncio.run(serve(args.host, args.port, args.unix, args.workers, args.move_seconds))
+    elif args.command == 'client':
+        end = asyncio.run(stand_in_client(args.host, args.port, args.unix, args.opponent, args.seat,
+                                          human_move if args.human else None))
+        print(board.display(board.pack_state(end['state']), None))
+        print("Game over (%s): %s" % (end['reason'], end['points']))
+    else:
+        asyncio.run(selftest(args.games, args.opponent, args.workers, args.move_seconds))
@@ -1,67 +1,325 @@
-import sys
+import argparse
+import io
+import json
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from contextlib import redirect_stdout
+from functools import partial
+from itertools import combinations
 from timeit import default_timer as time
 import p3_t3
+import match_stats
+from game_record import RecordWriter
+from search_stats import SearchStats
 import mcts_vanilla
+import playout_policy
+import mcts_parallel
+import opening_book
 import mcts_modified
 import random_bot
 import rollout_bot
 
+# one per seat, kept at module level so play_game can give each seat its own and stop them once the game is over
+pondering = (mcts_vanilla.PonderingSearch(), mcts_vanilla.PonderingSearch())
+
 players = dict(
     random_bot=random_bot.think,
     rollout_bot=rollout_bot.think,
+    rollout_adaptive=rollout_bot.think_adaptive,
     mcts_vanilla=mcts_vanilla.think,
+    mcts_heuristic=partial(mcts_vanilla.think, policy=playout_policy.heuristic),
+    mcts_rave=partial(mcts_vanilla.think, rave=300),
+    mcts_reuse=mcts_vanilla.Search().think,
+    mcts_ponder=pondering[0].think,
+    mcts_parallel=mcts_parallel.think,
+    mcts_book=opening_book.think,
     mcts_modified=mcts_modified.think
 )
 
 board = p3_t3.Board()
 state0 = board.starting_state()
 
-if len(sys.argv) != 3:
-    print("Need two player arguments")
-    exit(1)
-
-p1 = sys.argv[1]
-if p1 not in players:
-    print("p1 not in "+players.keys().join(","))
-    exit(1)
-p2 = sys.argv[2]
-if p2 not in players:
-    print("p2 not in "+players.keys().join(","))
-    exit(1)
-
-player1 = players[p1]
-player2 = players[p2]
 
-rounds = 100
-wins = {'draw':0, 1:0, 2:0}
+def play_game(player1, player2, stats=None, actions=None):
+    """ Plays one game between two think functions, player1 moving first.
 
-start = time()  # To log how much time the simulation takes.
-for i in range(rounds):
-
-    print("")
-    print("Round %d, fight!" % i)
+    Args:
+        stats:      Optional SearchStats that the profile of every mcts_vanilla think call is merged into.
+        actions:    Optional list that every action played is appended to.
 
+    Returns:    The final points_values of the game and the number of moves played.
+    """
+    # a pondering bot playing itself would otherwise ponder for one seat while the other thinks on the same search
+    if player2 == pondering[0].think:
+        player2 = pondering[1].think
     state = state0
-    last_action = None
+    moves = 0
     current_player = player1
     while not board.is_ended(state):
         last_action = current_player(board, state)
+        if stats is not None and mcts_vanilla.last_stats is not None:
+            stats.merge(mcts_vanilla.last_stats)
+            mcts_vanilla.last_stats = None
         state = board.next_state(state, last_action)
+        if actions is not None:
+            actions.append(last_action)
         current_player = player1 if current_player == player2 else player2
-    print("Finished!")
-    print()
-    final_score = board.points_values(state)
-    winner = 'draw'
-    if final_score[1] == 1:
-        winner = 1
-    elif final_score[2] == 1:
-        winner = 2
-    print("The %s bot wins this round! (%s)" % (winner, str(final_score)))
-    wins[winner] = wins.get(winner, 0) + 1
-
-print("")
-print("Final win counts:", dict(wins))
-
-# Also output the time elapsed.
-end = time()
-print(end - start, ' seconds')
+        moves += 1
+    for search in pondering:
+        search.stop()
+    return board.points_values(state), moves
+
+
+def play_seeded(game, first, second, seed, profile=False, keep_actions=False):
+    """ Plays one tournament game in a worker process with its own seed and the bots' output silenced.
+
+    Returns:    A JSON-serializable record of the game. winner is a player name, 'draw', or None if the game
+                could not be finished, in which case error holds the reason. score is the first player's
+                points_values. With profile, stats holds the merged SearchStats of the game, and with
+                keep_actions, actions holds the moves played as action_table indices.
+    """
+    random.seed(seed)
+    mcts_vanilla.profile = profile
+    stats = SearchStats() if profile else None
+    actions = [] if keep_actions else None
+    record = dict(game=game, first=first, second=second, seed=seed, winner=None)
+    start = time()
+    try:
+        with redirect_stdout(io.StringIO()):
+            final_score, moves = play_game(players[first], players[second], stats, actions)
+    except Exception as e:
+        record['error'] = repr(e)
+    else:
+        record['moves'] = moves
+        record['score'] = final_score[1]
+        record['winner'] = first if final_score[1] == 1 else second if final_score[2] == 1 else 'draw'
+    record['seconds'] = time() - start
+    if stats is not None:
+        record['stats'] = stats.as_dict()
+    if actions is not None:
+        record['actions'] = [p3_t3.action_indices[action] for action in actions]
+    return record
+
+
+def finish_record(record, out=None, stats=None, writer=None):
+    """ Collects what a worker sent back with a game record: its profile into stats, its moves into the game
+    log writer and the record itself as a JSON line into out.
+    """
+    if 'stats' in record:
+        stats.merge(SearchStats.from_dict(record['stats']))
+    if 'actions' in record:
+        actions = [p3_t3.action_table[action] for action in record.pop('actions')]
+        result = None
+        if record['winner'] is not None:
+            result = 0 if record['winner'] == 'draw' else 1 if record['score'] == 1 else 2
+        writer.write(actions, result)
+        writer.flush()
+    if out is not None:
+        out.write(json.dumps(record) + '\n')
+        out.flush()
+
+
+def tournament(pairings, rounds, workers, seed, out=None, stats=None, writer=None):
+    """ Plays rounds games for every pairing across a process pool, alternating who moves first, and streams
+    each finished game to out as a JSON line.
+
+    Args:
+        pairings:   A list of (name, name) pairs of players.
+        rounds:     The number of games per pairing.
+        workers:    The number of worker processes.
+        seed:       The seed of the first game; game i is played with seed + i.
+        out:        Optional file object for the per-game JSON lines.
+        stats:      Optional SearchStats to profile mcts_vanilla into.
+        writer:     Optional game_record.RecordWriter to log the moves of every game to.
+
+    Returns:    Name -> {'win', 'draw', 'loss', 'error'} totals, counting every game once for each seat.
+    """
+    totals = dict((name, dict(win=0, draw=0, loss=0, error=0)) for pairing in pairings for name in pairing)
+    jobs = []
+    for p1, p2 in pairings:
+        for i in range(rounds):
+            first, second = (p1, p2) if i % 2 == 0 else (p2, p1)
+            jobs.append((len(jobs), first, second, seed + len(jobs)))
+
+    # Unlike multiprocessing.Pool, the executor's workers may start processes of their own (mcts_parallel).
+    with ProcessPoolExecutor(workers) as executor:
+        futures = [executor.submit(play_seeded, *job, profile=stats is not None, keep_actions=writer is not None)
+                   for job in jobs]
+        for future in as_completed(futures):
+            record = future.result()
+            finish_record(record, out, stats, writer)
+
+            # by seat rather than by name, so a player paired with itself gets one win and one loss per game
+            for name, seat in ((record['first'], 1), (record['second'], -1)):
+                if record['winner'] is None:
+                    totals[name]['error'] += 1
+                elif record['winner'] == 'draw':
+                    totals[name]['draw'] += 1
+                else:
+                    totals[name]['win' if seat * record['score'] == 1 else 'loss'] += 1
+            print("Game %d: %s vs %s, %s" % (record['game'], record['first'], record['second'],
+                                             record.get('error') or "winner " + record['winner']))
+    return totals
+
+
+def sprt_match(p1, p2, test, rounds, workers, seed, out=None, stats=None, writer=None):
+    """ Plays p1 against p2 across a process pool, alternating who moves first, until the sequential test
+    accepts a hypothesis or rounds games have been played. No more than workers games are in flight, so
+    little work is wasted once the result is decided.
+
+    Args:
+        p1, p2:     The names of the players; results are scored from p1's point of view.
+        test:       A match_stats.SPRT.
+        rounds:     The maximum number of games.
+        workers:    The number of worker processes.
+        seed:       The seed of the first game; game i is played with seed + i.
+        out:        Optional file object for the per-game JSON lines.
+        stats:      Optional SearchStats to profile mcts_vanilla into.
+        writer:     Optional game_record.RecordWriter to log the moves of every game to.
+
+    Returns:    The test's decision, 'H0', 'H1' or None if rounds ran out first.
+    """
+    workers = workers or os.cpu_count() or 1
+    games = 0
+    with ProcessPoolExecutor(workers) as executor:
+        pending = set()
+        while test.status() is None and (pending or games < rounds):
+            while games < rounds and len(pending) < workers:
+                first, second = (p1, p2) if games % 2 == 0 else (p2, p1)
+                pending.add(executor.submit(play_seeded, games, first, second, seed + games, stats is not None,
+                                            writer is not None))
+                games += 1
+
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                record = future.result()
+                finish_record(record, out, stats, writer)
+                if record['winner'] is None:
+                    test.errors += 1
+                    print("Game %d: %s" % (record['game'], record['error']))
+                    continue
+                # by seat rather than by name, so a player can be tested against itself
+                score = record['score'] if record['game'] % 2 == 0 else -record['score']
+                test.add((score + 1) / 2.)
+                print("Game %d: winner %s %s" % (record['game'], record['winner'], test))
+
+        for future in pending:
+            future.cancel()
+    return test.status()
+
+
+def simulate(player1, player2, rounds, stats=None, writer=None):
+    """ The classic match: rounds games in this process with player1 always moving first. """
+    wins = {'draw':0, 1:0, 2:0}
+
+    for i in range(rounds):
+
+        print("")
+        print("Round %d, fight!" % i)
+
+        actions = [] if writer is not None else None
+        final_score, moves = play_game(player1, player2, stats, actions)
+        print("Finished!")
+        print()
+        winner = 'draw'
+        if final_score[1] == 1:
+            winner = 1
+        elif final_score[2] == 1:
+            winner = 2
+        print("The %s bot wins this round! (%s)" % (winner, str(final_score)))
+        if writer is not None:
+            writer.write(actions, 0 if winner == 'draw' else winner)
+        wins[winner] = wins.get(winner, 0) + 1
+
+    print("")
+    print("Final win counts:", dict(wins))
+
+
+# Worker processes may re-import this module, so only play when run as a script.
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Play bots against each other.")
+    parser.add_argument('players', nargs='*', help="two of: " + ", ".join(players))
+    parser.add_argument('--rounds', type=int, default=100, help="games per pairing")
+    parser.add_argument('--workers', type=int, default=0,
+                        help="play a tournament across this many processes instead of one game at a time")
+    parser.add_argument('--round-robin', action='store_true', help="pair every player with every other one")
+    parser.add_argument('--seed', type=int, default=None, help="seed of the first tournament game")
+    parser.add_argument('--out', default=None, help="JSON-lines file to append tournament games to")
+    parser.add_argument('--record', default=None, help="binary game log to append the moves of every game to")
+    parser.add_argument('--profile', action='store_true',
+                        help="profile every mcts_vanilla search and print the totals for the match")
+    parser.add_argument('--sprt', action='store_true',
+                        help="stop as soon as a sequential probability ratio test decides the match, "
+                             "with --rounds as the maximum number of games")
+    parser.add_argument('--elo0', type=float, default=0., help="Elo difference of p1 over p2 under H0")
+    parser.add_argument('--elo1', type=float, default=20., help="Elo difference of p1 over p2 under H1")
+    parser.add_argument('--alpha', type=float, default=0.05, help="probability of wrongly accepting H1")
+    parser.add_argument('--beta', type=float, default=0.05, help="probability of wrongly accepting H0")
+    args = parser.parse_args()
+
+    if args.round_robin:
+        pairings = list(combinations(players, 2))
+    elif len(args.players) != 2:
+        print("Need two player arguments")
+        exit(1)
+    else:
+        for name, label in zip(args.players, ("p1", "p2")):
+            if name not in players:
+                print(label + " not in " + ",".join(players))
+                exit(1)
+        pairings = [tuple(args.players)]
+
+    if args.sprt and args.round_robin:
+        print("--sprt needs exactly two players")
+        exit(1)
+
+    stats = None
+    if args.profile:
+        mcts_vanilla.profile = True
+        stats = SearchStats()
+
+    writer = RecordWriter(args.record) if args.record else None
+
+    start = time()  # To log how much time the simulation takes.
+    if args.workers or args.round_robin or args.sprt:
+        seed = args.seed if args.seed is not None else random.getrandbits(32)
+        out = open(args.out, 'a') if args.out else None
+        try:
+            if args.sprt:
+                test = match_stats.SPRT(args.elo0, args.elo1, args.alpha, args.beta)
+                decision = sprt_match(pairings[0][0], pairings[0][1], test, args.rounds, args.workers or None,
+                                      seed, out, stats, writer)
+            else:
+                totals = tournament(pairings, args.rounds, args.workers or None, seed, out, stats, writer)
+        finally:
+            if out is not None:
+                out.close()
+        print("")
+        if args.sprt:
+            interval = match_stats.elo_interval(test.wins, test.draws, test.losses)
+            print("SPRT %s: %s" % (decision or "undecided after %d games" % args.rounds, test))
+            if test.errors:
+                print("%d games could not be finished" % test.errors)
+            if interval is None:
+                print("No finished games, so no Elo difference of %s over %s" % (pairings[0][0], pairings[0][1]))
+            else:
+                low, estimate, high = interval
+                print("Elo difference of %s over %s: %.1f (95%% interval %.1f to %.1f)"
+                      % (pairings[0][0], pairings[0][1], estimate, low, high))
+        else:
+            for name, total in sorted(totals.items()):
+                print("%-14s %s" % (name, total))
+    else:
+        simulate(players[pairings[0][0]], players[pairings[0][1]], args.rounds, stats, writer)
+
+    if writer is not None:
+        writer.close()
+        print("Recorded %d games to %s" % (writer.games, args.record))
+
+    if stats is not None:
+        print("Search profile over %d think calls: %s" % (stats.thinks, stats))
+
+    # Also output the time elapsed.
+    end = time()
+    print(end - start, ' seconds')
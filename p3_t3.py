@@ -18,6 +18,8 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 
+import random
+
 num_players = 2
 
 positions = dict(
@@ -49,6 +51,9 @@ class Board(object):
         # and finally the player number to move.
         return (0, 0) * 10 + (None, None, 1)
 
+    def mutable(self, state):
+        return MutableBoard(state)
+
     def display(self, state, action, _unicode=True):
         actions = dict(
             ((R, C, r, c), p)
@@ -195,7 +200,7 @@ class Board(object):
         updated_board = state[board_index + player_index]
 
         full = (state[board_index] | state[board_index + 1] == 0x1ff)
-        if any(updated_board & w == w for w in self.wins):
+        if win_table[updated_board]:
             state[18 + player_index] |= positions[(R, C)]
         elif full:
             state[18] |= positions[(R, C)]
@@ -239,58 +244,80 @@ class Board(object):
         return (R, C) == (state[20], state[21])
 
     def legal_actions(self, state):
-        R, C = state[20], state[21]
-        Rset, Cset = (R,), (C,)
-        if R is None:
-            Rset, Cset = range(3), range(3)
-
-        occupied = [
-            state[2 * x] | state[2 * x + 1] for x in range(9)
-        ]
         finished = state[18] | state[19]
 
-        actions = [
-            (R, C, r, c)
-            for R in Rset
-            for C in Cset
-            for r in range(3)
-            for c in range(3)
-            if not occupied[3 * R + C] & positions[(r, c)]
-            and not finished & positions[(R, C)]
-        ]
+        if state[20] is not None:
+            sub = 3 * state[20] + state[21]
+            if finished & (1 << sub):
+                return []
+            return list(free_actions[sub][state[2 * sub] | state[2 * sub + 1]])
 
+        actions = []
+        for sub in range(9):
+            if not finished & (1 << sub):
+                actions += free_actions[sub][state[2 * sub] | state[2 * sub + 1]]
         return actions
 
+    def legal_action_bits(self, state):
+        """ The legal actions as an 81-bit mask, with bit 9 * (3 * R + C) + (3 * r + c) set for action (R, C, r, c).
+        Use action_table to map a bit index back to its action.
+        """
+        finished = state[18] | state[19]
+        subs = range(9) if state[20] is None else (3 * state[20] + state[21],)
+
+        bits = 0
+        for sub in subs:
+            if not finished & (1 << sub):
+                bits |= (~(state[2 * sub] | state[2 * sub + 1]) & 0x1ff) << (9 * sub)
+        return bits
+
+    def random_action(self, state, random=random.random):
+        """ Picks a legal action uniformly at random without building the list of legal actions. """
+        finished = state[18] | state[19]
+
+        if state[20] is not None:
+            sub = 3 * state[20] + state[21]
+            free = ~(state[2 * sub] | state[2 * sub + 1]) & 0x1ff
+            return action_table[9 * sub + select_table[free][int(random() * popcount_table[free])]]
+
+        frees = [0 if finished & (1 << sub) else ~(state[2 * sub] | state[2 * sub + 1]) & 0x1ff
+                 for sub in range(9)]
+        k = int(random() * sum([popcount_table[free] for free in frees]))
+        for sub, free in enumerate(frees):
+            if k < popcount_table[free]:
+                return action_table[9 * sub + select_table[free][k]]
+            k -= popcount_table[free]
+
     def previous_player(self, state):
         return 3 - state[-1]
 
     def current_player(self, state):
         return state[-1]
 
-    def is_ended(self, state):
-        p1 = state[18] & ~state[19]
-        p2 = state[19] & ~state[18]
+    def outcome(self, state):
+        """ Classifies the big board with the win lookup table.
 
-        if any(w & p1 == w for w in self.wins):
-            return True
-        if any(w & p2 == w for w in self.wins):
-            return True
-        if state[18] | state[19] == 0x1ff:
-            return True
+        Returns 1 or 2 for the winning player, 0 for a draw and None while the game is still being played.
+        """
+        p1, p2 = state[18], state[19]
+        if win_table[p1 & ~p2]:
+            return 1
+        if win_table[p2 & ~p1]:
+            return 2
+        if p1 | p2 == 0x1ff:
+            return 0
+        return None
 
-        return False
+    def is_ended(self, state):
+        return self.outcome(state) is not None
 
     def win_values(self, state):
-        if not self.is_ended(state):
-            return
-        p1 = state[18] & ~state[19]
-        p2 = state[19] & ~state[18]
-
-        if any(w & p1 == w for w in self.wins):
+        result = self.outcome(state)
+        if result == 1:
             return {1: 1, 2: 0}
-        if any(w & p2 == w for w in self.wins):
+        if result == 2:
             return {1: 0, 2: 1}
-        if state[18] | state[19] == 0x1ff:
+        if result == 0:
             return {1: 0.5, 2: 0.5}
 
     def owned_boxes(self, state):
@@ -308,16 +335,12 @@ class Board(object):
         return ret
         
     def points_values(self, state):
-        if not self.is_ended(state):
-            return
-        p1 = state[18] & ~state[19]
-        p2 = state[19] & ~state[18]
-
-        if any(w & p1 == w for w in self.wins):
+        result = self.outcome(state)
+        if result == 1:
             return {1: 1, 2: -1}
-        if any(w & p2 == w for w in self.wins):
+        if result == 2:
             return {1: -1, 2: 1}
-        if state[18] | state[19] == 0x1ff:
+        if result == 0:
             return {1: 0, 2: 0}
 
     def winner_message(self, winners):
@@ -326,3 +349,269 @@ class Board(object):
         if value == 0.5:
             return "Draw."
         return "Winner: Player {0}.".format(winner)
+
+    # The packed encoding stores a whole state in one int: the 18 sub-board masks at
+    # bits 9 * i for tuple index i, the two big-board masks from bit 162, the
+    # constraint as 3 * R + C (or 9 when unconstrained) from bit 180, and the player
+    # to move at bit 184 (0 for player 1, 1 for player 2).
+
+    def state_to_int(self, state):
+        code = 0
+        for i in range(20):
+            code |= state[i] << (9 * i)
+        constraint = 9 if state[20] is None else 3 * state[20] + state[21]
+        return code | (constraint << constraint_shift) | ((state[22] - 1) << player_shift)
+
+    def int_to_state(self, code):
+        state = [(code >> (9 * i)) & 0x1ff for i in range(20)]
+        constraint = (code >> constraint_shift) & 0xf
+        if constraint == 9:
+            state.extend([None, None])
+        else:
+            state.extend(divmod(constraint, 3))
+        state.append((code >> player_shift) + 1)
+        return tuple(state)
+
+    def next_state_int(self, code, action):
+        R, C, r, c = action
+        player_index = code >> player_shift
+        board_index = 2 * (3 * R + C)
+
+        code |= positions[(r, c)] << (9 * (board_index + player_index))
+        updated_board = (code >> (9 * (board_index + player_index))) & 0x1ff
+        occupied = ((code >> (9 * board_index)) | (code >> (9 * board_index + 9))) & 0x1ff
+
+        if win_table[updated_board]:
+            code |= positions[(R, C)] << (big_shift + 9 * player_index)
+        elif occupied == 0x1ff:
+            code |= (positions[(R, C)] << big_shift) | (positions[(R, C)] << (big_shift + 9))
+
+        finished = ((code >> big_shift) | (code >> (big_shift + 9))) & 0x1ff
+        constraint = 9 if finished & positions[(r, c)] else 3 * r + c
+        return (code & ~(0x1f << constraint_shift)) | (constraint << constraint_shift) \
+            | ((1 - player_index) << player_shift)
+
+    def legal_actions_int(self, code):
+        constraint = (code >> constraint_shift) & 0xf
+        finished = ((code >> big_shift) | (code >> (big_shift + 9))) & 0x1ff
+        subs = range(9) if constraint == 9 else (constraint,)
+
+        actions = []
+        for sub in subs:
+            if not finished & (1 << sub):
+                actions += free_actions[sub][((code >> (18 * sub)) | (code >> (18 * sub + 9))) & 0x1ff]
+        return actions
+
+    def current_player_int(self, code):
+        return (code >> player_shift) + 1
+
+    def outcome_int(self, code):
+        p1 = (code >> big_shift) & 0x1ff
+        p2 = (code >> (big_shift + 9)) & 0x1ff
+        if win_table[p1 & ~p2]:
+            return 1
+        if win_table[p2 & ~p1]:
+            return 2
+        if p1 | p2 == 0x1ff:
+            return 0
+        return None
+
+    def is_ended_int(self, code):
+        return self.outcome_int(code) is not None
+
+    # The 8 symmetries of the square act on the big board and on every sub-board at
+    # once: sub-board (R, C) moves to the image of (R, C) and its cells are permuted
+    # by the same transform, as is the constraint. Transform 0 is the identity.
+
+    def transform_state(self, state, transform):
+        cells = transform_cells[transform]
+        masks = transform_table[transform]
+        result = [0] * 18
+        for sub in range(9):
+            result[2 * cells[sub]] = masks[state[2 * sub]]
+            result[2 * cells[sub] + 1] = masks[state[2 * sub + 1]]
+        result += [masks[state[18]], masks[state[19]]]
+        if state[20] is None:
+            result += [None, None]
+        else:
+            result += divmod(cells[3 * state[20] + state[21]], 3)
+        result.append(state[22])
+        return tuple(result)
+
+    def transform_action(self, action, transform):
+        R, C, r, c = action
+        cells = transform_cells[transform]
+        return divmod(cells[3 * R + C], 3) + divmod(cells[3 * r + c], 3)
+
+    def canonical(self, state):
+        """ The representative of the symmetry class of state, with the smallest state_to_int of the 8 images.
+
+        Returns:    The canonical state and the transform that maps state to it. Actions in state map to the
+                    canonical state with transform_action(action, transform), and back with
+                    transform_action(action, inverse_transforms[transform]).
+        """
+        best_state, best_code, best_transform = state, self.state_to_int(state), 0
+        for transform in range(1, 8):
+            image = self.transform_state(state, transform)
+            code = self.state_to_int(image)
+            if code < best_code:
+                best_state, best_code, best_transform = image, code, transform
+        return best_state, best_transform
+
+    def symmetries(self, state):
+        """ The transforms that map state to itself, always including the identity. """
+        return [transform for transform in range(8)
+                if transform == 0 or self.transform_state(state, transform) == tuple(state)]
+
+    def unique_actions(self, state):
+        """ The legal actions with a single representative of every set of actions that the symmetries of state
+        map onto each other, since they lead to equivalent positions.
+        """
+        actions = self.legal_actions(state)
+        symmetries = self.symmetries(state)
+        if len(symmetries) == 1:
+            return actions
+        return [action for action in actions
+                if all(action <= self.transform_action(action, transform) for transform in symmetries)]
+
+
+class MutableBoard(object):
+    """ A position that is updated in place. make plays an action on the underlying 23-entry list and pushes
+    what it overwrote onto a preallocated undo stack, so unmake can restore it without any per-move allocation.
+    The list can be handed to any Board method that takes a state.
+    """
+    __slots__ = ('state', 'undo', 'depth')
+
+    def __init__(self, state):
+        self.state = list(state)
+        self.undo = [None] * (5 * 81)
+        self.depth = 0
+
+    def make(self, action):
+        R, C, r, c = action
+        state = self.state
+        player_index = state[22] - 1
+        sub = 3 * R + C
+        cell = 3 * r + c
+
+        undo, i = self.undo, self.depth
+        undo[i] = action
+        undo[i + 1] = state[18]
+        undo[i + 2] = state[19]
+        undo[i + 3] = state[20]
+        undo[i + 4] = state[21]
+        self.depth = i + 5
+
+        state[22] = 2 - player_index
+        updated_board = state[2 * sub + player_index] | (1 << cell)
+        state[2 * sub + player_index] = updated_board
+
+        if win_table[updated_board]:
+            state[18 + player_index] |= 1 << sub
+        elif state[2 * sub] | state[2 * sub + 1] == 0x1ff:
+            state[18] |= 1 << sub
+            state[19] |= 1 << sub
+
+        if (state[18] | state[19]) & (1 << cell):
+            state[20] = state[21] = None
+        else:
+            state[20] = r
+            state[21] = c
+
+    def unmake(self):
+        """ Takes back the last action passed to make and returns it. """
+        state, undo = self.state, self.undo
+        i = self.depth = self.depth - 5
+        action = undo[i]
+        player_index = 2 - state[22]
+
+        state[22] = player_index + 1
+        state[2 * (3 * action[0] + action[1]) + player_index] &= ~(1 << (3 * action[2] + action[3]))
+        state[18] = undo[i + 1]
+        state[19] = undo[i + 2]
+        state[20] = undo[i + 3]
+        state[21] = undo[i + 4]
+        return action
+
+    def snapshot(self):
+        """ The current position as an immutable state tuple. """
+        return tuple(self.state)
+
+
+# Every sub-board and the big board is a 9-bit mask, so "does this mask contain a
+# completed line?" is answered once per mask here instead of scanning Board.wins.
+win_table = tuple(
+    any(mask & w == w for w in Board.wins)
+    for mask in range(512)
+)
+
+# win_cells_table[mask] is the 9-bit mask of cells that would complete a line for a
+# player already holding mask. Cells that are taken still have to be masked out.
+win_cells_table = tuple(
+    sum(1 << cell for cell in range(9) if not mask & (1 << cell) and win_table[mask | (1 << cell)])
+    for mask in range(512)
+)
+
+# Bit offsets of the fields in the packed single-int state (see Board.state_to_int).
+big_shift = 9 * 18
+constraint_shift = 9 * 20
+player_shift = constraint_shift + 4
+
+# Move generation tables. action_table[9 * (3 * R + C) + (3 * r + c)] is the action
+# (R, C, r, c), action_indices maps it back to its index, and
+# free_actions[3 * R + C][occupied] lists the actions on the cells of sub-board
+# (R, C) that are not set in the 9-bit occupied mask.
+action_table = tuple(
+    (R, C, r, c)
+    for R in range(3)
+    for C in range(3)
+    for r in range(3)
+    for c in range(3)
+)
+
+action_indices = dict((action, index) for index, action in enumerate(action_table))
+
+free_actions = tuple(
+    tuple(
+        tuple(action_table[9 * sub + cell] for cell in range(9) if not occupied & (1 << cell))
+        for occupied in range(512)
+    )
+    for sub in range(9)
+)
+
+# popcount_table[mask] is the number of set bits in a 9-bit mask and
+# select_table[mask][k] is the index of its k-th lowest set bit.
+popcount_table = tuple(bin(mask).count('1') for mask in range(512))
+
+select_table = tuple(
+    tuple(cell for cell in range(9) if mask & (1 << cell))
+    for mask in range(512)
+)
+
+# transform_cells[t][3 * r + c] is the cell that transform t moves cell (r, c) to:
+# the identity, the rotations by 90, 180 and 270 degrees, and the reflections in the
+# horizontal and vertical middle lines and in both diagonals. transform_table[t] is
+# the matching permutation of 9-bit masks and inverse_transforms[t] undoes t.
+transform_cells = tuple(
+    tuple(3 * R + C for R, C in (f(r, c) for r in range(3) for c in range(3)))
+    for f in (
+        lambda r, c: (r, c),
+        lambda r, c: (c, 2 - r),
+        lambda r, c: (2 - r, 2 - c),
+        lambda r, c: (2 - c, r),
+        lambda r, c: (2 - r, c),
+        lambda r, c: (r, 2 - c),
+        lambda r, c: (c, r),
+        lambda r, c: (2 - c, 2 - r),
+    )
+)
+
+transform_table = tuple(
+    tuple(sum(1 << cells[cell] for cell in range(9) if mask & (1 << cell)) for mask in range(512))
+    for cells in transform_cells
+)
+
+inverse_transforms = tuple(
+    next(u for u in range(8) if all(transform_cells[u][transform_cells[t][cell]] == cell for cell in range(9)))
+    for t in range(8)
+)
@@ -0,0 +1,62 @@
+import random as _random
+from p3_t3 import action_table, popcount_table, select_table, win_cells_table
+
+# A playout policy is a function (board, state) -> action that picks the next move of a rollout. state may be
+# the list of a MutableBoard.
+
+
+def uniform(board, state):
+    """ A uniformly random legal action. """
+    return board.random_action(state)
+
+
+def safe_cells(sub, own, free, finished):
+    """ The free cells of sub-board sub that do not send the opponent to a finished sub-board, as finished after
+    the move: the cell in position sub sends them back to sub itself, which is finished if the move there wins
+    it or fills it.
+    """
+    bit = 1 << sub
+    if free & bit and (win_cells_table[own] & bit or free == bit):
+        finished |= bit
+    return free & ~finished
+
+
+def heuristic(board, state, random=_random.random):
+    """ A random action from the first non-empty class of: moves that win a sub-board, moves that block a
+    sub-board win of the opponent, moves that do not send the opponent to a finished sub-board (which would give
+    them a free choice), and any legal move. The classes are read from win_cells_table, so this costs little
+    more than a uniform move.
+    """
+    finished = state[18] | state[19]
+    me = state[22] - 1
+
+    if state[20] is not None:
+        sub = 3 * state[20] + state[21]
+        own, other = state[2 * sub + me], state[2 * sub + 1 - me]
+        free = ~(own | other) & 0x1ff
+        cells = (win_cells_table[own] & free or win_cells_table[other] & free
+                 or safe_cells(sub, own, free, finished) or free)
+        return action_table[9 * sub + select_table[cells][int(random() * popcount_table[cells])]]
+
+    # unconstrained: the same classes over every sub-board still being played
+    wins, blocks, safe, free_cells = [], [], [], []
+    for sub in range(9):
+        if finished & (1 << sub):
+            continue
+        own, other = state[2 * sub + me], state[2 * sub + 1 - me]
+        free = ~(own | other) & 0x1ff
+        if win_cells_table[own] & free:
+            wins.append((sub, win_cells_table[own] & free))
+        if win_cells_table[other] & free:
+            blocks.append((sub, win_cells_table[other] & free))
+        cells = safe_cells(sub, own, free, finished)
+        if cells:
+            safe.append((sub, cells))
+        free_cells.append((sub, free))
+
+    choices = wins or blocks or safe or free_cells
+    k = int(random() * sum([popcount_table[cells] for sub, cells in choices]))
+    for sub, cells in choices:
+        if k < popcount_table[cells]:
+            return action_table[9 * sub + select_table[cells][k]]
+        k -= popcount_table[cells]
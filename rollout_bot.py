@@ -1,7 +1,43 @@
-import random
+from math import ceil, log2
 
 ROLLOUTS = 10
 MAX_DEPTH = 5
+BUDGET = 240                # Total playouts of think_adaptive, at most ROLLOUTS per legal move.
+
+last_allocation = None      # Move -> playouts spent on it by the last think_adaptive call.
+
+
+def outcome(board, state, me):
+    """ Calculates the difference between the bot's score and the opponent's at the end of a rollout. """
+    game_points = board.points_values(state)
+    if game_points is not None:
+        # Try to normalize it up?  Not so sure about this code anyhow.
+        red_score = game_points[1]*9
+        blue_score = game_points[2]*9
+    else:
+        owned_boxes = board.owned_boxes(state)
+        red_score = len([v for v in owned_boxes.values() if v == 1])
+        blue_score = len([v for v in owned_boxes.values() if v == 2])
+    return red_score - blue_score if me == 1 else blue_score - red_score
+
+
+def sample(board, game, move, me):
+    """ Plays move and then random moves to depth MAX_DEPTH in place on the mutable board game, scores the
+    result for player me and takes all the moves back.
+    """
+    rollout_state = game.state
+    game.make(move)
+
+    # Only play to the specified depth.
+    for i in range(MAX_DEPTH):
+        if board.is_ended(rollout_state):
+            break
+        game.make(board.random_action(rollout_state))
+
+    score = outcome(board, rollout_state, me)
+    while game.depth:
+        game.unmake()
+    return score
 
 
 def think(board, state):
@@ -22,33 +58,15 @@ def think(board, state):
 
     me = board.current_player(state)
 
-    # Define a helper function to calculate the difference between the bot's score and the opponent's.
-    def outcome(owned_boxes, game_points):
-        if game_points is not None:
-            # Try to normalize it up?  Not so sure about this code anyhow.
-            red_score = game_points[1]*9
-            blue_score = game_points[2]*9
-        else:
-            red_score = len([v for v in owned_boxes.values() if v == 1])
-            blue_score = len([v for v in owned_boxes.values() if v == 2])
-        return red_score - blue_score if me == 1 else blue_score - red_score
+    # All rollouts are played in place on one mutable board and taken back afterwards.
+    game = board.mutable(state)
 
     for move in moves:
         total_score = 0.0
 
         # Sample a set number of games where the target move is immediately applied.
         for r in range(ROLLOUTS):
-            rollout_state = board.next_state(state, move)
-
-            # Only play to the specified depth.
-            for i in range(MAX_DEPTH):
-                if board.is_ended(rollout_state):
-                    break
-                rollout_move = random.choice(board.legal_actions(rollout_state))
-                rollout_state = board.next_state(rollout_state, rollout_move)
-
-            total_score += outcome(board.owned_boxes(rollout_state),
-                                   board.points_values(rollout_state))
+            total_score += sample(board, game, move, me)
 
         expectation = float(total_score) / ROLLOUTS
 
@@ -59,3 +77,50 @@ def think(board, state):
 
     print("Rollout bot picking %s with expected score %f" % (str(best_move), best_expectation))
     return best_move
+
+
+def think_adaptive(board, state, budget=None):
+    """ Like think, but spends a total playout budget by successive halving: every round splits what is left
+    of the budget evenly over the moves still in contention, then drops the worse half of them by average
+    score. Bad moves are given up on after a sample or two, and the last contenders get most of the playouts.
+
+    Args:
+        board:  The game setup.
+        state:  The state of the game.
+        budget: The number of playouts, BUDGET by default, never more than ROLLOUTS per legal move. Every
+                contender gets at least one playout per round, so a budget below the number of legal moves
+                is overspent.
+
+    Returns:    The action with the maximal average score among the last contenders.
+
+    """
+    global last_allocation
+    moves = board.legal_actions(state)
+    if budget is None:
+        budget = min(BUDGET, ROLLOUTS * len(moves))
+
+    me = board.current_player(state)
+    game = board.mutable(state)
+    totals = dict((move, 0.0) for move in moves)
+    counts = dict((move, 0) for move in moves)
+
+    contenders = moves
+    rounds = max(ceil(log2(len(moves))), 1)
+    spent = 0
+    for round_index in range(rounds):
+        per_move = max((budget - spent) // ((rounds - round_index) * len(contenders)), 1)
+        for move in contenders:
+            for r in range(per_move):
+                totals[move] += sample(board, game, move, me)
+            counts[move] += per_move
+        spent += per_move * len(contenders)
+
+        # keep the better half, rounded up, for the next round
+        contenders = sorted(contenders, key=lambda move: totals[move] / counts[move], reverse=True)
+        contenders = contenders[:(len(contenders) + 1) // 2]
+
+    best_move = contenders[0]
+    last_allocation = counts
+    print("Rollout bot picking %s with expected score %f (%d playouts over %d moves in %d rounds, %d on it)"
+          % (str(best_move), totals[best_move] / counts[best_move], spent, len(moves), rounds, counts[best_move]))
+    return best_move
@@ -0,0 +1,72 @@
+from timeit import default_timer as time
+
+phases = ('traverse', 'expand', 'rollout', 'backpropagate')
+
+
+class SearchStats:
+    def __init__(self):
+        """ Instrumentation of MCTS searches: time and calls per phase plus tree statistics. One object describes
+        a single think call, or a whole match once several have been merged into it.
+        """
+        self.phase_seconds = dict((phase, 0.) for phase in phases)     # Phase -> cumulative seconds
+        self.phase_calls = dict((phase, 0) for phase in phases)         # Phase -> number of calls
+
+        self.thinks = 0             # Number of think calls described
+        self.iterations = 0         # MCTS iterations run
+        self.nodes_created = 0      # Nodes added to the tree
+        self.max_depth = 0          # Deepest expanded node, in plies below the root
+        self.depth_total = 0        # Sum of expansion depths, for the mean
+        self.rollout_moves = 0      # Moves played in rollouts, for the mean rollout length
+        self.root_visits = {}       # Action -> visits of the root children, for the last think call only
+
+    def __repr__(self):
+        return ' '.join(["[", "Iterations:", str(self.iterations), "Nodes:", str(self.nodes_created),
+                         "Depth: %.1f mean, %d max" % (self.mean_depth(), self.max_depth),
+                         "Rollout: %.1f moves" % self.mean_rollout_length()] +
+                        ["%s: %.3fs" % (phase, self.phase_seconds[phase]) for phase in phases] + ["]"])
+
+    def mean_depth(self):
+        return self.depth_total / self.iterations if self.iterations else 0.
+
+    def mean_rollout_length(self):
+        return self.rollout_moves / self.iterations if self.iterations else 0.
+
+    def record(self, phase, seconds):
+        self.phase_seconds[phase] += seconds
+        self.phase_calls[phase] += 1
+
+    def timed(self, phase, function):
+        """ Wraps function so that every call is recorded under phase. """
+        def timed_function(*args):
+            start = time()
+            result = function(*args)
+            self.record(phase, time() - start)
+            return result
+        return timed_function
+
+    def merge(self, other):
+        """ Adds the counts of other into this object, keeping this object's root_visits. """
+        for phase in phases:
+            self.phase_seconds[phase] += other.phase_seconds[phase]
+            self.phase_calls[phase] += other.phase_calls[phase]
+        self.thinks += other.thinks
+        self.iterations += other.iterations
+        self.nodes_created += other.nodes_created
+        self.max_depth = max(self.max_depth, other.max_depth)
+        self.depth_total += other.depth_total
+        self.rollout_moves += other.rollout_moves
+
+    def as_dict(self):
+        """ A JSON-serializable copy, with actions in the root visit distribution written as strings. """
+        data = dict(self.__dict__)
+        data['root_visits'] = dict((' '.join(map(str, action)), visits)
+                                   for action, visits in self.root_visits.items())
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls()
+        stats.__dict__.update(data)
+        stats.root_visits = dict((tuple(map(int, action.split())), visits)
+                                 for action, visits in data['root_visits'].items())
+        return stats
@@ -0,0 +1,188 @@
+import argparse
+import glob
+import os
+import random
+import re
+from multiprocessing import Process, Queue
+from queue import Empty
+from timeit import default_timer as time
+import numpy as np
+import p3_t3
+import mcts_vanilla
+from mcts_node import MCTSNode
+
+# One record per position: the state as in batch_rollout.to_arrays (the 20 masks, the constraint as 3 * R + C or
+# -1 when unconstrained and the player to move), the visits of every root child indexed like p3_t3.action_table,
+# and the final points_values of the game for the player to move. Shards are preallocated with zeros, so rows
+# with player 0 were never written.
+record_dtype = np.dtype([
+    ('masks', np.uint16, (20,)),
+    ('constraint', np.int8),
+    ('player', np.int8),
+    ('visits', np.uint32, (81,)),
+    ('value', np.int8),
+])
+
+shard_name = 'shard-%05d.npy'
+
+
+def play_game(board, iterations):
+    """ Plays mcts_vanilla against itself, searching every legal action at the root.
+
+    Returns:    A record array with one row per position of the game.
+    """
+    states, distributions = [], []
+    state = board.starting_state()
+    while not board.is_ended(state):
+        visits = [0] * 81
+        actions = board.legal_actions(state)
+        if len(actions) == 1:
+            action = actions[0]
+            visits[p3_t3.action_indices[action]] = 1
+        else:
+            root_node = MCTSNode(parent=None, parent_action=None, action_list=actions)
+            mcts_vanilla.search(board, state, root_node, iterations)
+            for child_action, child_node in root_node.child_nodes.items():
+                visits[p3_t3.action_indices[child_action]] = child_node.visits
+            action = mcts_vanilla.select_action(root_node, board.current_player(state))[0]
+        states.append(state)
+        distributions.append(visits)
+        state = board.next_state(state, action)
+
+    final = board.points_values(state)
+    records = np.zeros(len(states), dtype=record_dtype)
+    records['masks'] = [position[:20] for position in states]
+    records['constraint'] = [-1 if position[20] is None else 3 * position[20] + position[21] for position in states]
+    records['player'] = [position[22] for position in states]
+    records['visits'] = distributions
+    records['value'] = [final[position[22]] for position in states]
+    return records
+
+
+def worker(queue, seeds, iterations):
+    """ Plays one game per seed and puts its records on queue, which blocks while the queue is full so that the
+    workers never run far ahead of the shard writer. Puts None when done.
+    """
+    board = p3_t3.Board()
+    for seed in seeds:
+        random.seed(seed)
+        queue.put(play_game(board, iterations))
+    queue.put(None)
+
+
+class ShardWriter:
+    def __init__(self, directory, shard_size=65536):
+        """ Writes records to memory-mapped .npy shards of shard_size rows in directory. Numbering continues
+        after the highest shard already there, so an interrupted run can simply be started again.
+        """
+        self.directory = directory
+        self.shard_size = shard_size
+        os.makedirs(directory, exist_ok=True)
+        numbers = [int(re.search(r'(\d+)', os.path.basename(path)).group(1))
+                   for path in glob.glob(os.path.join(directory, 'shard-*.npy'))]
+        self.number = max(numbers) + 1 if numbers else 0
+        self.shard = None
+        self.row = 0
+        self.written = 0
+
+    def open_shard(self):
+        path = os.path.join(self.directory, shard_name % self.number)
+        self.shard = np.lib.format.open_memmap(path, mode='w+', dtype=record_dtype, shape=(self.shard_size,))
+        self.number += 1
+        self.row = 0
+
+    def write(self, records):
+        """ Copies a record array into the shards, opening new ones as they fill up. """
+        start = 0
+        while start < len(records):
+            if self.shard is None:
+                self.open_shard()
+            count = min(len(records) - start, self.shard_size - self.row)
+            self.shard[self.row:self.row + count] = records[start:start + count]
+            self.row += count
+            start += count
+            if self.row == self.shard_size:
+                self.close_shard()
+        self.written += len(records)
+
+    def close_shard(self):
+        if self.shard is not None:
+            self.shard.flush()
+            self.shard = None
+
+    def close(self):
+        self.close_shard()
+
+
+def read_shards(directory):
+    """ Yields the written records of every shard in directory, memory-mapped rather than loaded. """
+    for path in sorted(glob.glob(os.path.join(directory, 'shard-*.npy'))):
+        shard = np.load(path, mmap_mode='r')
+        yield shard[shard['player'] > 0]
+
+
+def run(directory, games, workers, iterations, seed, shard_size=65536, queue_size=64):
+    """ Plays games self-play games across workers processes and writes their positions to shards in directory.
+
+    Args:
+        directory:  Where the shards go.
+        games:      The number of games.
+        workers:    The number of worker processes.
+        iterations: MCTS iterations per move.
+        seed:       Game i is played with seed + i.
+        shard_size: Rows per shard file.
+        queue_size: Games that may wait for the writer before the workers block.
+
+    Returns:    The number of positions written.
+    """
+    queue = Queue(queue_size)
+    processes = [Process(target=worker, args=(queue, range(seed + i, seed + games, workers), iterations))
+                 for i in range(workers)]
+    for process in processes:
+        process.start()
+
+    writer = ShardWriter(directory, shard_size)
+    start = time()
+    finished = done = 0
+    try:
+        while finished < workers:
+            try:
+                records = queue.get(timeout=1)
+            except Empty:
+                if any(process.exitcode for process in processes):
+                    raise RuntimeError("a self-play worker died")
+                continue
+            if records is None:
+                finished += 1
+                continue
+            writer.write(records)
+            done += 1
+            if done % 10 == 0 or done == games:
+                elapsed = time() - start
+                print("%d games, %d positions, %.0f positions per minute"
+                      % (done, writer.written, 60 * writer.written / elapsed))
+    finally:
+        writer.close()
+        for process in processes:
+            # workers can be blocked on the full queue if the writer gave up early
+            if finished < workers:
+                process.terminate()
+            process.join()
+    return writer.written
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Generate self-play data with mcts_vanilla.")
+    parser.add_argument('directory', help="directory for the shard files")
+    parser.add_argument('--games', type=int, default=100, help="number of games to play")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="number of worker processes")
+    parser.add_argument('--iterations', type=int, default=mcts_vanilla.num_nodes, help="MCTS iterations per move")
+    parser.add_argument('--seed', type=int, default=None, help="seed of the first game")
+    parser.add_argument('--shard-size', type=int, default=65536, help="positions per shard file")
+    parser.add_argument('--queue', type=int, default=64, help="finished games buffered before workers wait")
+    args = parser.parse_args()
+
+    seed = args.seed if args.seed is not None else random.getrandbits(32)
+    start = time()
+    positions = run(args.directory, args.games, args.workers, args.iterations, seed, args.shard_size, args.queue)
+    print("Wrote %d positions in %.1f seconds" % (positions, time() - start))
@@ -0,0 +1,64 @@
+from collections import OrderedDict
+
+
+class TranspositionTable:
+    def __init__(self, capacity=100000):
+        """ Maps game states to the MCTSNode already holding their statistics, so that a position reached
+        through different move orders shares one node and the tree becomes a DAG. Once more than capacity
+        states are stored, the least recently visited one is evicted; its node stays in the tree but will no
+        longer be shared.
+
+        Args:
+            capacity:   The maximum number of states to keep.
+
+        """
+        self.capacity = capacity
+        self.nodes = OrderedDict()      # State -> MCTSNode, least recently visited first
+
+        self.hits = 0                   # Lookups that found a node
+        self.misses = 0                 # Lookups that did not
+        self.evictions = 0              # States dropped to stay within capacity
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def __repr__(self):
+        return ' '.join(["[", "Size:", "%d/%d" % (len(self.nodes), self.capacity),
+                         "Hits:", str(self.hits), "Misses:", str(self.misses),
+                         "Evictions:", str(self.evictions), "]"])
+
+    def get(self, state):
+        """ Returns the node stored for state and marks it as visited, or None. """
+        node = self.nodes.get(state)
+        if node is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.nodes.move_to_end(state)
+        return node
+
+    def put(self, state, node):
+        self.nodes[state] = node
+        self.nodes.move_to_end(state)
+        if len(self.nodes) > self.capacity:
+            self.nodes.popitem(last=False)
+            self.evictions += 1
+
+    def touch(self, state):
+        """ Marks state as visited without counting a lookup. """
+        if state in self.nodes:
+            self.nodes.move_to_end(state)
+
+    def retain(self, root_node):
+        """ Drops the states whose nodes are not below root_node, so that the subtrees left behind when the
+        search moves on to a new root can be freed.
+        """
+        below = set([id(root_node)])
+        stack = [root_node]
+        while stack:
+            for child_node in stack.pop().child_nodes.values():
+                if id(child_node) not in below:
+                    below.add(id(child_node))
+                    stack.append(child_node)
+        for state in [state for state, node in self.nodes.items() if id(node) not in below]:
+            del self.nodes[state]